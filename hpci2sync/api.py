@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+"""Push of icinga2 objects changes through icinga2 REST API, so they are
+   applied at runtime without reloading icinga2. Only attributes of existing
+   Host objects are modified: objects defined in zones.d files cannot be
+   created or deleted through the API without conflicting with the files on
+   next reload, those changes still require a reload, as well as Endpoint
+   and Zone changes."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import ssl
+import json
+import base64
+import threading
+from multiprocessing.pool import ThreadPool
+
+try:
+    from http.client import HTTPConnection, HTTPSConnection, HTTPException
+    from urllib.parse import urlparse, quote
+except ImportError:  # python 2
+    from httplib import HTTPConnection, HTTPSConnection, HTTPException
+    from urlparse import urlparse
+    from urllib import quote
+
+# objects types URL path components
+OBJECT_TYPES = { 'Host': 'hosts',
+                 'Endpoint': 'endpoints',
+                 'Zone': 'zones' }
+
+
+class ApiRequest(object):
+    """Modification of the attributes of an icinga2 object."""
+
+    def __init__(self, objtype, name, attrs):
+
+        self.objtype = objtype
+        self.name = name
+        self.attrs = attrs
+
+    @property
+    def path(self):
+
+        return '/v1/objects/%s/%s' % (OBJECT_TYPES[self.objtype],
+                                      quote(self.name, safe=''))
+
+    @property
+    def body(self):
+
+        return json.dumps({ 'attrs': self.attrs }, sort_keys=True)
+
+
+def modifications(diff):
+
+    """Returns the list of API requests applying the changes of an objects
+       diff, and the number of changes which cannot be applied through the
+       API: added and removed objects, changes of imported templates, of
+       Endpoint and Zone objects and removed attributes."""
+    requests = []
+    unsupported = len(diff.added) + len(diff.removed)
+    for objtype, name, changes in diff.changed:
+        # Zone parent and endpoints cannot be modified at runtime and an
+        # Endpoint host change has no effect until reconnection. A removed
+        # var would be set to null instead of being removed.
+        if objtype != 'Host' or 'imports' in changes or \
+           any([ new is None for old, new in changes.values() ]):
+            unsupported += 1
+            continue
+        requests.append(ApiRequest(objtype, name,
+                                   dict([ (field, new)
+                                          for field, (old, new)
+                                          in changes.items() ])))
+    return requests, unsupported
+
+
+class ApiClient(object):
+    """Client of icinga2 REST API sending batches of requests with bounded
+       concurrency. Every worker thread has its own keep-alive connection,
+       reused for all the requests it sends."""
+
+    def __init__(self, url, user, password, ca=None, timeout=10, workers=4,
+                 batch=100):
+
+        parsed = urlparse(url)
+        self.https = parsed.scheme == 'https'
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.timeout = timeout
+        self.workers = workers
+        self.batch = batch
+        self.context = None
+        if self.https:
+            self.context = ssl.create_default_context(cafile=ca or None)
+        credentials = ('%s:%s' % (user, password)).encode('utf-8')
+        self.headers = { 'Accept': 'application/json',
+                         'Content-Type': 'application/json',
+                         'Connection': 'keep-alive',
+                         'Authorization': 'Basic ' +
+                           base64.b64encode(credentials).decode('ascii') }
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if self.https:
+                connection = HTTPSConnection(self.host, self.port,
+                                             timeout=self.timeout,
+                                             context=self.context)
+            else:
+                connection = HTTPConnection(self.host, self.port,
+                                            timeout=self.timeout)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _reset(self):
+
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def send(self, request):
+
+        """Sends the request and returns None on success or the error
+           message. The request is retried once on a new connection if the
+           keep-alive connection was closed by the server."""
+        for attempt in range(2):
+            try:
+                connection = self._connection()
+                connection.request('POST', request.path, request.body,
+                                   self.headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (HTTPException, IOError) as err:
+                self._reset()
+                if attempt:
+                    return str(err)
+                continue
+            if response.status != 200:
+                return "HTTP %d: %s" % (response.status,
+                                        data.decode('utf-8', 'replace'))
+            return None
+
+    def _send_batch(self, batch):
+
+        return [ (request, self.send(request)) for request in batch ]
+
+    def push(self, requests):
+
+        """Sends all requests in batches, with at most workers batches sent
+           concurrently, and returns the list of (request, error) tuples,
+           error being None on success."""
+        batches = [ requests[index:index + self.batch]
+                    for index in range(0, len(requests), self.batch) ]
+        pool = ThreadPool(max(min(self.workers, len(batches)), 1))
+        try:
+            results = pool.map(self._send_batch, batches)
+        finally:
+            pool.close()
+            pool.join()
+            for connection in self._connections:
+                connection.close()
+        return [ result for batch in results for result in batch ]
@@ -39,17 +39,21 @@ import sys
 import subprocess
 import shutil
 from string import Template
-import difflib
-import pwd
-
-import jinja2
-
+import hashlib
+import json
+import time
+
+# Only lightweight modules are imported here. The template engine, the YAML
+# parser, ClusterShell and the modules depending on them are imported by the
+# actions which actually need them, to keep startup fast for --help and
+# cleanup action.
 from hpci2sync.args import parse_args
 from hpci2sync.conf import ConfRun
 from hpci2sync.keys import KeysManager
 from hpci2sync.cluster import NetworksSet
-from hpci2sync.privatedata import PrivateData
+from hpci2sync.routing import ZonesRouting
 from hpci2sync.tmp import TmpDirManager
+from hpci2sync.hostlog import HostsLog, set_detail
 
 class MainApp(object):
 
@@ -63,16 +67,31 @@ class MainApp(object):
         self.conf.override(self.args)
 
         self.conf.dump()
+        if self.conf.debug_hosts:
+            set_detail(self.conf.debug_hosts)
         self.keys = KeysManager(self.conf.file_keys)
 
         self.clusters = None
         self.networks = None
+        self.routing = None
+        self.source = None
 
         # used for certs
         self.all_certs_ok = True
+        self.journal = None
+        self.certs_log = HostsLog(logger)
 
         # used for conf
+        self.all_installed = True
         self.tmpdir = None
+        self.staging = None
+        self.targets = None
+        self.fragments = None
+        self.tpl_env = None
+        self.emitter = None
+        self.state = None
+        self.rendered_hosts = 0
+        self.settings = None  # signature of conf file and templates
 
     def setup_logger(self):
 
@@ -92,9 +111,21 @@ class MainApp(object):
             self._sync_certs()
         elif self.conf.action == 'conf':
             self._sync_conf()
+        elif self.conf.action == 'sync':
+            self._sync()
+        elif self.conf.action == 'query':
+            self._query()
+        elif self.conf.action == 'rollback':
+            self._rollback()
+        elif self.conf.action == 'status':
+            self._status()
         else:
             self._cleanup()
 
+        # reported once both actions of sync are done
+        if not self.all_installed:
+            sys.exit(1)
+
     def _init_networks(self):
 
         self.networks = NetworksSet()
@@ -103,29 +134,259 @@ class MainApp(object):
         self.networks.add('management', self.conf.net_mgt)
         self.networks.add('bmc', self.conf.net_bmc)
 
+    def _init_source(self):
+
+        """Set the source of input files, the given revision of privatedata
+           git repository or the filesystem by default."""
+        from hpci2sync.source import FilesystemSource, GitSource
+
+        if self.conf.revision is not None:
+            self.source = GitSource(self.conf.dir_privatedata,
+                                    self.conf.revision)
+        else:
+            # All input directories are crawled once, parsers, static conf
+            # copy and change detection query the resulting tree index.
+            self.source = FilesystemSource([ self.conf.dir_equipments,
+                                             self.conf.dir_hieradata,
+                                             self.conf.dir_conf,
+                                             self.conf.dir_templates ])
+
     def _parse_privatedata(self):
 
+        from hpci2sync.privatedata import PrivateData
+
         logger.info("parsing privatedata")
+        if self.source is None:
+            self._init_source()
         self._init_networks()
-        self.privatedata = PrivateData(self.conf, self.networks)
+        self.privatedata = PrivateData(self.conf, self.networks, self.source)
         self.clusters = self.privatedata.parse()
+        self._check_conflicts()
+
+    def _check_conflicts(self, detector=None):
+
+        """Reports equipments sharing IP addresses or FQDN, either in all
+           clusters or in the clusters already added to the given detector.
+           Depending on conflicts parameter, conflicts are ignored, logged as
+           warnings or logged as errors before aborting the run."""
+        from hpci2sync.conflicts import ConflictsDetector
+
+        if self.conf.conflicts == 'ignore':
+            return
+        if detector is None:
+            detector = ConflictsDetector()
+            detector.check(self.clusters)
+        if not len(detector):
+            logger.debug("no IP address or FQDN conflict detected")
+            return
+        if self.conf.conflicts == 'fail':
+            detector.report(logger.error)
+            logger.error("%d IP address or FQDN conflicts detected, aborting",
+                         len(detector))
+            sys.exit(1)
+        detector.report(logger.warning)
+        logger.warning("%d IP address or FQDN conflicts detected",
+                       len(detector))
 
     def _cleanup(self):
 
         logger.debug('running cleanup action')
         self.tmpdir = TmpDirManager(self.conf.dir_tmp)
         self.tmpdir.mrproper()
+
+    def _init_routing(self):
+
+        self.routing = ZonesRouting(self.conf.profs_master,
+                                    self.conf.prof_monsat,
+                                    self.conf.nodes_roles)
+
+    def _route_zones(self):
+
+        self._init_routing()
+        self.routing.classify(self.clusters)
+
+    #
+    # query methods
+    #
+
+    def _query(self):
+
+        from hpci2sync.index import InventoryIndex, inputs_signature
+
+        logger.debug('running query action')
+        index = InventoryIndex(os.path.join(self.conf.dir_cache,
+                                            'inventory.db'))
+        index.open()
+        self._init_source()
+        signature = inputs_signature(self.conf, self.source)
+        if index.signature() != signature:
+            self._parse_privatedata()
+            self._route_zones()
+            index.rebuild(self.clusters, self.routing, signature)
+        else:
+            logger.debug("inventory index is up-to-date")
+        self.source.close()
+
+        hosts = index.query(**self.conf.query)
+        index.close()
+
+        if self.conf.query_format == 'json':
+            json.dump(hosts, sys.stdout, indent=2, sort_keys=True)
+            sys.stdout.write('\n')
+            return
+        for host in hosts:
+            netifs = ','.join([ "%s=%s" % netif
+                                for netif in sorted(host['netifs'].items()) ])
+            sys.stdout.write("%s %s cluster=%s zone=%s ip=%s role=%s "
+                             "netifs=%s profiles=%s\n"
+                             % (host['name'], host['fqdn'], host['cluster'],
+                                host['zone'], host['ip'], host['role'],
+                                netifs, ','.join(host['profiles'])))
+
+    #
+    # rollback methods
+    #
+
+    def _rollback(self):
+
+        from hpci2sync.generations import Generations
+
+        logger.debug('running rollback action')
+        for name, dir_icinga2, owner in self.conf.targets:
+            generations = Generations(dir_icinga2, self.conf.generations)
+            try:
+                gen = generations.previous(self.conf.rollback_to)
+            except ValueError as err:
+                logger.error("unable to roll back target %s: %s", name, err)
+                sys.exit(1)
+            logger.info("rolling back target %s from generation %s to %d",
+                        name, str(generations.current()), gen)
+            if not self.conf.dryrun:
+                generations.switch(gen)
+
+        # The installed files do not match the synced commit and the state
+        # of the last run anymore, the next conf sync must consider all
+        # zones.
+        for path in [ self._synced_commit_file(), self._state_file() ]:
+            if not self.conf.dryrun and os.path.exists(path):
+                os.unlink(path)
+
+        if not self.conf.dryrun:
+            logger.info("reload icing2 with:")
+            logger.info("# systemctl reload icinga2.service")
+
+    #
+    # status methods
+    #
+
+    def _status(self):
+
+        """Compares the input files and the installed files with the state
+           of the last conf run, prints the result on one line and exits with
+           a Nagios plugin return code."""
+        from hpci2sync.state import RunState, GLOBAL, inputs_signatures, \
+                                    settings_signature
+
+        logger.debug('running status action')
+        state = RunState(self._state_file())
+        if not state.load():
+            self._status_exit(3, "no state of previous conf run in %s"
+                                 % (state.path))
+
+        # inputs are checked in the same source as the last run
+        if state.commit is None:
+            self.conf.revision = None
+        elif self.conf.revision is None:
+            self.conf.revision = 'HEAD'
+        self._init_source()
+        if self.source.ondisk:
+            signatures = inputs_signatures(self.conf, self.source)
+            stale = state.stale_clusters(signatures)
+        else:
+            stale = sorted(self._zones_changed_since(state.commit))
+            if (state.inputs or {}).get(GLOBAL) != \
+               settings_signature(self.conf):
+                stale.append(GLOBAL)
+        self.source.close()
+        modified = state.modified_outputs()
+
+        code = 0
+        problems = []
+        if modified:
+            code = 2
+            problems.append("%d installed files modified or missing: %s"
+                            % (len(modified), ','.join(modified)))
+        if stale:
+            code = max(code, 1)
+        if GLOBAL in stale:
+            stale.remove(GLOBAL)
+            problems.append("inputs of all zones stale")
+        if stale:
+            problems.append("%d clusters stale: %s"
+                            % (len(stale), ','.join(stale)))
+        if not problems:
+            problems.append("conf up to date")
+        last_run = time.strftime('%Y-%m-%d %H:%M:%S',
+                                 time.localtime(state.finished))
+        self._status_exit(code, "%s, last run %s (%d zones, %d hosts, "
+                                "%d files)"
+                                % ('; '.join(problems), last_run,
+                                   state.counts.get('zones', 0),
+                                   state.counts.get('hosts', 0),
+                                   state.counts.get('files', 0)))
+
+    def _status_exit(self, code, msg):
+
+        labels = [ 'OK', 'WARNING', 'CRITICAL', 'UNKNOWN' ]
+        sys.stdout.write("%s: %s\n" % (labels[code], msg))
+        sys.exit(code)
+
+    #
+    # sync methods
+    #
+
+    def _sync(self):
+
+        """Runs certs and conf actions concurrently on the same parsed
+           privatedata. Zones are routed before the actions are started, as
+           routing sets the IP addresses and the attributes of the
+           equipments, so both actions only read the clusters."""
+        from multiprocessing.pool import ThreadPool
+
+        logger.debug('running sync action')
+        self._parse_privatedata()
+        self._route_zones()
+        pool = ThreadPool(2)
+        try:
+            results = [ pool.apply_async(action)
+                        for action in [ self._sync_certs, self._sync_conf ] ]
+            for result in results:
+                result.get()
+        finally:
+            pool.close()
+            pool.join()
+
     #
     # certs methods
     #
 
     def _sync_certs(self):
 
+        from hpci2sync.journal import CertsJournal
+
         logger.debug('running sync certs action')
-        self._parse_privatedata()
+        if self.clusters is None:
+            self._parse_privatedata()
+        self.journal = CertsJournal(os.path.join(self.conf.dir_cache,
+                                                 'certs.journal'))
+        self.journal.load()
         for cluster in self.clusters:
             self._sync_certs_cluster(cluster)
 
+        # the run is complete, there is nothing left to resume
+        if not self.conf.dryrun:
+            self.journal.remove()
+
         if self.all_certs_ok:
             logger.info('all certificates are OK')
 
@@ -138,12 +399,14 @@ class MainApp(object):
 
         for equipment in cluster:
             self._sync_certs_equipment(cluster, equipment, dir_crtdst)
+        self.certs_log.flush()
 
     def _sync_certs_equipment(self, cluster, equipment, dir_crtdst):
 
         if equipment.category != 'server' or \
            equipment.role in self.conf.nodes_roles:
-            logger.debug("skipping equipment %s in certs sync", equipment.name)
+            self.certs_log.debug("skipping equipment %s in certs sync",
+                                 equipment.name)
             return
 
         # original CSR, certificate and key in icinga2 CA directory
@@ -155,207 +418,690 @@ class MainApp(object):
         crtdst_file = os.path.join(dir_crtdst, equipment.name + '.crt')
         keydst_file = os.path.join(dir_crtdst, equipment.name + '.key.enc')
 
-        logger.debug("checking if %s certificate/key files exist in %s",
-                     equipment.name, dir_crtdst)
-        if os.path.exists(crtdst_file) and os.path.exists(keydst_file):
-            logger.debug("certificate already exist for %s", equipment.name)
+        # output files of every step, a recorded step is done again if its
+        # output files are missing
+        outputs = { 'new-cert': [ csr_file, key_file ],
+                    'sign': [ crt_file ],
+                    'copy': [ crtdst_file ],
+                    'encrypt': [ keydst_file ],
+                    'chmod': [ keydst_file ] }
+
+        self.certs_log.debug("checking if %s certificate/key files exist in %s",
+                             equipment.name, dir_crtdst)
+        if not self.journal.steps(equipment.name) and \
+           os.path.exists(crtdst_file) and os.path.exists(keydst_file):
+            self.certs_log.debug("certificate already exist for %s",
+                                 equipment.name)
             return
 
-        self.all_certs_ok = False
-        logger.info("creating new CSR, certificate and key for %s",
-                    equipment.name)
-        cmd = [ 'icinga2', 'pki', 'new-cert', '--cn', equipment.fqdn,
-                '--csr', csr_file, '--key', key_file ]
-        if not self.conf.dryrun:
-            subprocess.check_call(cmd)
-
-        cmd = [ 'icinga2', 'pki', 'sign-csr',
-                '--csr', csr_file, '--cert', crt_file ]
-        if not self.conf.dryrun:
-            subprocess.check_call(cmd)
-
-        logger.debug("copying crt %s to %s", crt_file, crtdst_file)
-        if not self.conf.dryrun:
-            shutil.copyfile(crt_file, crtdst_file)
-
-        logger.debug("encoding key %s to %s", key_file, keydst_file)
-        cmd = [ 'openssl', 'aes-256-cbc', '-in', key_file, '-out', keydst_file,
-                '-k', self.keys.get(cluster.name) ]
-
-        if not self.conf.dryrun:
-            subprocess.check_call(cmd)
+        start = self.journal.resume(equipment.name, outputs)
+        steps = self.journal.STEPS[start:]
+        if not steps:
+            self.certs_log.debug("certificate already created for %s "
+                                 "according to journal", equipment.name)
+            return
 
-        logger.debug("setting strict mode on encoded key %s", keydst_file)
-        if not self.conf.dryrun:
-            os.chmod(keydst_file, 0400)
+        self.all_certs_ok = False
+        if start:
+            logger.info("resuming creation of certificate and key for %s at "
+                        "step %s", equipment.name, steps[0])
+        else:
+            logger.info("creating new CSR, certificate and key for %s",
+                        equipment.name)
+
+        if 'new-cert' in steps:
+            cmd = [ 'icinga2', 'pki', 'new-cert', '--cn', equipment.fqdn,
+                    '--csr', csr_file, '--key', key_file ]
+            self._run_certs_step(equipment, 'new-cert', cmd)
+
+        if 'sign' in steps:
+            cmd = [ 'icinga2', 'pki', 'sign-csr',
+                    '--csr', csr_file, '--cert', crt_file ]
+            self._run_certs_step(equipment, 'sign', cmd)
+
+        if 'copy' in steps:
+            logger.debug("copying crt %s to %s", crt_file, crtdst_file)
+            self._run_certs_step(equipment, 'copy',
+                                 lambda: shutil.copyfile(crt_file,
+                                                         crtdst_file))
+
+        if 'encrypt' in steps:
+            logger.debug("encoding key %s to %s", key_file, keydst_file)
+            cmd = [ 'openssl', 'aes-256-cbc', '-in', key_file,
+                    '-out', keydst_file, '-k', self.keys.get(cluster.name) ]
+            self._run_certs_step(equipment, 'encrypt', cmd)
+
+        if 'chmod' in steps:
+            logger.debug("setting strict mode on encoded key %s", keydst_file)
+            self._run_certs_step(equipment, 'chmod',
+                                 lambda: os.chmod(keydst_file, 0o400))
+
+    def _run_certs_step(self, equipment, step, action):
+
+        """Runs the action of certificate creation step, either a command or
+           a callable, and records its completion in the journal. Nothing is
+           done in dry run mode."""
+        if self.conf.dryrun:
+            return
+        if callable(action):
+            action()
+        else:
+            subprocess.check_call(action)
+        self.journal.record(equipment.name, step)
 
     #
     # conf methods
     #
 
-    def _zone_dir(self, zone):
-        
-        return os.path.join(self.tmpdir.path, zone)
-
     def _load_template(self, name):
 
-        tpl_loader = jinja2.FileSystemLoader(searchpath=self.conf.dir_templates)
-        tpl_env = jinja2.Environment(loader=tpl_loader)
+        import jinja2
+
+        if self.tpl_env is None:
+            tpl_loader = jinja2.FileSystemLoader(
+                           searchpath=self.conf.dir_templates)
+            self.tpl_env = jinja2.Environment(loader=tpl_loader)
         tpl = name
-        template = tpl_env.get_template(tpl)
+        template = self.tpl_env.get_template(tpl)
         return template
 
+    def _template_digest(self, name):
+
+        source = self.tpl_env.loader.get_source(self.tpl_env, name)[0]
+        return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+    def _render_host(self, tpl, tpl_digest, zone, host, kind):
+
+        """Returns the fragment of hosts file for the given host in zone, out
+           of the fragments cache if possible. The kind is either equipment or
+           node."""
+        key = self.fragments.key(host, tpl_digest, kind)
+        fragment = self.fragments.get(key)
+        if fragment is None and self.emitter is not None:
+            fragment = self.emitter.host(host, kind, zone)
+            self.fragments.set(key, fragment)
+        elif fragment is None:
+            if kind == 'node':
+                tpl_vars = { "hosts": [],
+                             "nodes": [host] }
+            else:
+                tpl_vars = { "hosts": [host],
+                             "nodes": None }
+            fragment = tpl.render(tpl_vars)
+            self.fragments.set(key, fragment)
+        return fragment
+
     def _gen_zone_hosts(self, zone, hosts, nodes=None):
 
-        os.makedirs(self._zone_dir(zone))
-        hosts_file = os.path.join(self._zone_dir(zone), 'hosts.conf')
+        hosts_file = os.path.join(zone, 'hosts.conf')
         logger.info("generating zone hosts file %s", hosts_file)
 
-        tpl = self._load_template('hosts.conf')
-        tpl_vars = { "hosts": hosts,
-                     "nodes": nodes }
-
-        with open(hosts_file, 'w+') as stream:
-            stream.write(tpl.render(tpl_vars))
+        if self.emitter is not None:
+            tpl = None
+            # emitted hosts objects depend on the zone with shared templates
+            tpl_digest = self.emitter.digest + ':' + zone
+        else:
+            tpl = self._load_template('hosts.conf')
+            tpl_digest = self._template_digest('hosts.conf')
+
+        # The hosts file is the concatenation of the shared templates, if
+        # enabled, then the fragments of all hosts followed by all nodes.
+        fragments = []
+        compact = nodes and self.conf.compact_nodes
+        if self.conf.shared_templates:
+            fragments.append(self.emitter.templates(zone, hosts, 'equipment'))
+            if nodes and not compact:
+                fragments.append(self.emitter.templates(zone, nodes, 'node'))
+        fragments.extend([ self._render_host(tpl, tpl_digest, zone, host,
+                                             'equipment')
+                           for host in hosts ])
+        if compact:
+            from hpci2sync.emitter import NativeEmitter
+            fragments.append(NativeEmitter().nodes(zone, nodes))
+        elif nodes:
+            fragments.extend([ self._render_host(tpl, tpl_digest, zone, node,
+                                                 'node')
+                               for node in nodes ])
+
+        objects = None
+        if self._objects_needed():
+            from hpci2sync.semdiff import host_object
+            objects = [ host_object(host, 'equipment') for host in hosts ] + \
+                      [ host_object(node, 'node') for node in nodes or [] ]
+
+        self.staging.add(hosts_file, u''.join(fragments), objects)
+        self.rendered_hosts += len(hosts) + len(nodes or [])
 
     def _gen_zone_zones(self, zone, hosts):
 
-        zones_file = os.path.join(self._zone_dir(zone), 'zones.conf')
+        zones_file = os.path.join(zone, 'zones.conf')
         logger.info("generating zone zones file %s", zones_file)
 
+        objects = None
+        if self._objects_needed():
+            from hpci2sync.semdiff import zones_objects
+            objects = []
+            for host in hosts:
+                objects.extend(zones_objects(host, zone))
+
+        if self.emitter is not None:
+            self.staging.add(zones_file, self.emitter.zones(hosts, zone),
+                             objects)
+            return
+
         tpl = self._load_template('zones.conf')
         tpl_vars = { "hosts": hosts,
                      "parent": zone }
 
-        with open(zones_file, 'w+') as stream:
-            stream.write(tpl.render(tpl_vars))
+        self.staging.add(zones_file, tpl.render(tpl_vars), objects)
 
     def _copy_zone_conf(self, zone):
 
         zone_dir = os.path.join(self.conf.dir_conf, zone)
-        dst_dir = os.path.join(self.tmpdir.path, zone)
-        if not os.path.exists(dst_dir):
-            os.makedirs(dst_dir)
-        zone_files = os.listdir(zone_dir)
+        zone_files = self.source.listdir(zone_dir)
         for zone_file in zone_files:
             src_file = os.path.join(zone_dir, zone_file)
-            dst_file = os.path.join(dst_dir, zone_file)
-            logger.debug("copying %s into %s", src_file, dst_file)
-            shutil.copyfile(src_file, dst_file)
+            dst_file = os.path.join(zone, zone_file)
+            logger.debug("staging %s as %s", src_file, dst_file)
+            if self.source.ondisk:
+                self.staging.link(dst_file, src_file)
+            else:
+                self.staging.add(dst_file, self.source.read(src_file))
+
+    def _synced_commit_file(self):
+
+        return os.path.join(self.conf.dir_cache, 'synced_commit')
+
+    def _changed_zones(self):
+
+        """Returns the set of zones whose input files changed since the last
+           synced commit of privatedata, or None if unknown. The
+           configuration file and the templates are not in privatedata, all
+           zones are synced when their signature changed."""
+        from hpci2sync.state import settings_signature
+
+        if self.source.ondisk:
+            return None
+        self.settings = settings_signature(self.conf)
+        try:
+            with open(self._synced_commit_file()) as stream:
+                record = stream.read().split()
+        except IOError:
+            record = []
+        if not record:
+            logger.info("no synced commit recorded, syncing all zones")
+            return None
+        synced = record[0]
+        if record[1:] != [ self.settings ]:
+            logger.info("configuration file or templates changed since "
+                        "synced commit %s, syncing all zones", synced)
+            return None
+        logger.info("syncing changes between commits %s and %s",
+                    synced, self.source.commit)
+        return self._zones_changed_since(synced)
+
+    def _zones_changed_since(self, synced):
+
+        """Returns the set of zones whose input files changed between the
+           synced commit and the source commit."""
+        zones = set()
+        clusters_dirs = [ self.source.relpath(path)
+                          for path in [ self.conf.dir_equipments,
+                                        self.conf.dir_hieradata,
+                                        self.conf.dir_conf ] ]
+        for path in self.source.changed_paths(synced):
+            for clusters_dir in clusters_dirs:
+                if path.startswith(clusters_dir + '/'):
+                    zones.add(path[len(clusters_dir) + 1:].split('/')[0])
+        logger.debug("zones with changes: %s", str(sorted(zones)))
+        return zones
+
+    def _record_synced_commit(self):
+
+        if self.source.ondisk:
+            return
+        logger.debug("recording synced commit %s", self.source.commit)
+        if not os.path.isdir(self.conf.dir_cache):
+            os.makedirs(self.conf.dir_cache)
+        with open(self._synced_commit_file(), 'w') as stream:
+            stream.write("%s %s\n" % (self.source.commit, self.settings))
+
+    def _state_file(self):
+
+        return os.path.join(self.conf.dir_cache, 'state.json')
+
+    def _init_state(self, zones):
+
+        """Initializes the state of the run with the signatures of the input
+           files, taken before parsing so that changes made during the run
+           are reported as stale. When only the zones with changes are
+           synced, the installed files of the other zones are kept from the
+           state of the previous run."""
+        from hpci2sync.state import RunState, GLOBAL, inputs_signatures
+
+        self.state = RunState(self._state_file())
+        if zones is None or not self.state.load():
+            self.state.outputs = {}
+        self.state.started = int(time.time())
+        if self.source.ondisk:
+            self.state.inputs = inputs_signatures(self.conf, self.source)
+        else:
+            # privatedata changes are known from the commit
+            self.state.commit = self.source.commit
+            self.state.inputs = { GLOBAL: self.settings }
+
+    def _save_state(self):
+
+        logger.debug("saving state of the run in %s", self.state.path)
+        for target in self.targets:
+            for staged in self.staging:
+                self.state.add_output(target.dst_file(staged))
+        zones = set([ staged.path.split('/')[0] for staged in self.staging ])
+        self.state.counts = { 'zones': len(zones),
+                              'hosts': self.rendered_hosts,
+                              'files': len(self.staging) }
+        self.state.save()
 
     def _sync_conf(self):
 
+        from hpci2sync.fragcache import FragmentsCache
+        from hpci2sync.install import InstallTarget
+        from hpci2sync.staging import StagingArea
+
         logger.debug('running sync conf action')
 
-        self.tmpdir = TmpDirManager(self.conf.dir_tmp)
-        self.tmpdir.make()
+        self.targets = [ InstallTarget(name, dir_icinga2, owner,
+                                       self.conf.generations)
+                         for name, dir_icinga2, owner in self.conf.targets ]
+        # shared templates are only supported by the native emitter
+        if self.conf.renderer == 'native' or self.conf.shared_templates:
+            from hpci2sync.emitter import NativeEmitter
+            self.emitter = NativeEmitter(self.conf.shared_templates)
+
+        # the sync action has already parsed all clusters
+        pipeline = self.conf.pipeline and self.clusters is None and \
+                   self.conf.shard is None and self.conf.merge_shards is None
+        spill = self.conf.staging_spill
+        if pipeline:
+            # rendered zones are spilled on disk as soon as they are staged,
+            # memory would grow with the whole site otherwise
+            spill = 0
+        self.staging = StagingArea(self.conf.staging_mode,
+                                   self.conf.dir_tmp,
+                                   spill)
+        # shards running concurrently have their own fragments caches
+        if self.conf.shard is not None:
+            fragments_file = 'fragments.%d.json' % (self.conf.shard[0])
+        else:
+            fragments_file = 'fragments.json'
+        self.fragments = FragmentsCache(
+                           os.path.join(self.conf.dir_cache, fragments_file),
+                           self.conf.cache_size)
+        self.fragments.load()
+
+        if self.source is None:
+            self._init_source()
+        zones = self._changed_zones()
+        if zones is not None and not zones and self.conf.shard is None and \
+           self.conf.merge_shards is None:
+            logger.info("no change in privatedata since last synced commit")
+            self.source.close()
+            return
 
-        self._parse_privatedata()
-        self._sync_conf_master()
-        for cluster in self.clusters:
-            self._sync_conf_cluster(cluster)
-        self._print_diff()
+        if self.conf.shard is not None:
+            self._sync_conf_shard(zones)
+            self.source.close()
+            self.fragments.report()
+            self.fragments.save()
+            self.staging.clean()
+            return
 
         if not self.conf.dryrun:
-            self._copy_conf()
+            self._init_state(zones)
 
-        self.tmpdir.clean()
+        if self.conf.merge_shards is not None:
+            self._merge_shards()
+        elif pipeline:
+            self._sync_conf_pipeline(zones)
+        else:
+            if self.clusters is None:
+                self._parse_privatedata()
+            # the sync action has already routed the zones
+            if self.routing is None:
+                self._route_zones()
+            # The master zone depends on all clusters, it is synced whenever
+            # something changed. Cluster zones are synced only when they have
+            # changes.
+            self._sync_conf_master()
+            for cluster in self.clusters:
+                if zones is not None and cluster.name not in zones:
+                    logger.debug("skipping cluster %s without changes",
+                                 cluster.name)
+                    continue
+                self._sync_conf_cluster(cluster)
+        self.source.close()
+        self.fragments.report()
+        self.fragments.save()
+        changes = None
+        if self._objects_needed():
+            changes = self._objects_changes()
+        self._print_diff(changes)
+
+        reload_needed = True
+        if self.conf.api_url is not None:
+            api_requests, reload_needed = self._api_requests(changes)
 
         if not self.conf.dryrun:
+            self.all_installed = self._copy_conf()
+        if not self.conf.dryrun and self.all_installed:
+            self._record_synced_commit()
+            self._save_state()
+            if self._objects_needed():
+                self._save_installed_objects()
+            if self.conf.api_url is not None and \
+               not self._push_api(api_requests):
+                reload_needed = True
+
+        self.staging.clean()
+
+        if not self.all_installed:
+            logger.error("installation failed on some targets, icinga2 must "
+                         "not be reloaded")
+        elif not self.conf.dryrun and not reload_needed:
+            logger.info("all changes applied through icinga2 API, no reload "
+                        "required")
+        elif not self.conf.dryrun:
             logger.info("check config with:")
             logger.info("# icinga2 daemon --validate --color")
             logger.info("reload icing2 with:")
             logger.info("# systemctl reload icinga2.service")
 
-    def _sync_conf_master(self):
+    def _sync_conf_pipeline(self, zones):
+
+        """Parses, routes and syncs the clusters one at a time. Once a
+           cluster zone is synced, the cluster and its satellite zone are
+           released, only the equipments monitored by master are kept until
+           the master zone is synced at the end."""
+        from hpci2sync.conflicts import ConflictsDetector
+        from hpci2sync.privatedata import PrivateData
+
+        logger.info("parsing and syncing privatedata clusters in pipeline")
+        self._init_networks()
+        self._init_routing()
+        self.privatedata = PrivateData(self.conf, self.networks, self.source)
+        detector = ConflictsDetector()
+        for cluster in self.privatedata.iter_clusters():
+            if self.conf.conflicts != 'ignore':
+                detector.add_cluster(cluster)
+            self.routing.classify_cluster(cluster)
+            if zones is not None and cluster.name not in zones:
+                logger.debug("skipping cluster %s without changes",
+                             cluster.name)
+            else:
+                self._sync_conf_cluster(cluster)
+            del self.routing.satellites[cluster.name]
+        # nothing is installed yet, the run can still be aborted
+        self._check_conflicts(detector)
+        self._sync_conf_master()
+
+    def _sync_conf_shard(self, zones):
 
-        hosts = []
-        servers = []
+        """Syncs the zones of the clusters of the shard in the shards
+           directory, along with the equipments every cluster contributes to
+           the master zone, for the merge step."""
+        from hpci2sync.shard import ShardStore
+
+        index, count = self.conf.shard
+        logger.info("syncing conf for shard %d/%d", index, count)
+        store = ShardStore(self.conf.dir_shards, index)
+        store.reset()
+        self._parse_privatedata()
+        self._init_routing()
+        names = []
         for cluster in self.clusters:
-            for equipment in cluster:
-                if equipment.monitored_by_master(self.conf.profs_master):
-                    logger.debug("equipment %s must be monitored by master",
-                                 equipment.name)
-                    equipment.ip = equipment.get_ip_netif('wan')
-                    equipment.set_attrs()
-                    hosts.append(equipment)
-                    if equipment.category == 'server' and \
-                       not equipment.has_profile([self.conf.prof_monsat]):
-                        servers.append(equipment)
-
-        self._gen_zone_hosts('master', hosts)
-        self._gen_zone_zones('master', servers)
+            names.append(cluster.name)
+            first_host = len(self.routing.master_hosts)
+            first_endpoint = len(self.routing.master_endpoints)
+            self.routing.classify_cluster(cluster)
+            store.save_master(cluster.name,
+                              self.routing.master_hosts[first_host:],
+                              self.routing.master_endpoints[first_endpoint:])
+            if zones is not None and cluster.name not in zones:
+                logger.debug("skipping cluster %s without changes",
+                             cluster.name)
+                continue
+            self._sync_conf_cluster(cluster)
+        store.save_zones(self.staging)
+        store.complete(count, names)
+        logger.info("shard %d/%d completed with clusters %s in %s",
+                    index, count, ','.join(names), store.path)
+
+    def _merge_shards(self):
+
+        """Stages the zones of all shards and syncs the master zone out of
+           the equipments contributed by all shards clusters, in clusters
+           name order as in a single run."""
+        from hpci2sync.privatedata import PrivateData
+        from hpci2sync.shard import ShardStore
+
+        count = self.conf.merge_shards
+        logger.info("merging %d shards", count)
+        self._init_routing()
+        stores = [ ShardStore(self.conf.dir_shards, index)
+                   for index in range(1, count + 1) ]
+        done = set()
+        for store in stores:
+            try:
+                done.update(store.check(count))
+            except ValueError as err:
+                logger.error("unable to merge shards: %s", err)
+                sys.exit(1)
+        # nothing is staged until the shards are known to cover exactly the
+        # clusters of privatedata
+        self._init_networks()
+        expected = set(PrivateData(self.conf, self.networks,
+                                   self.source).clusters_names())
+        if done != expected:
+            logger.error("unable to merge shards: clusters missing in "
+                         "shards: %s, unknown clusters in shards: %s",
+                         ','.join(sorted(expected - done)) or 'none',
+                         ','.join(sorted(done - expected)) or 'none')
+            sys.exit(1)
+        contributions = []
+        for store in stores:
+            contributions.extend(store.master())
+            for path, src, objects in store.zones():
+                logger.debug("staging %s from shard %d", path, store.index)
+                self.staging.link(path, src, objects)
+        for cluster, hosts, endpoints in sorted(contributions,
+                                                key=lambda item: item[0]):
+            self.routing.master_hosts.extend(hosts)
+            self.routing.master_endpoints.extend(endpoints)
+        self._sync_conf_master()
+
+    def _sync_conf_master(self):
+
+        self._gen_zone_hosts('master', self.routing.master_hosts)
+        self._gen_zone_zones('master', self.routing.master_endpoints)
         self._copy_zone_conf('master')
         self._copy_zone_conf('global-templates')
 
     def _sync_conf_cluster(self, cluster):
 
-        hosts = []
-        servers = []
-        nodes = []
-
         logger.debug("syncing conf for cluster %s", cluster.name)
-        for equipment in cluster:
-            if equipment.monitored_by_satellite(self.conf.profs_master):
-                logger.debug("equipment %s is monitored by satellite",
-                             equipment.name)
-
-                admin_ip = equipment.get_ip_netif('administration')
-                if admin_ip is not None:
-                    equipment.ip = admin_ip
-                else:
-                    equipment.ip = equipment.get_ip_netif('management')
-
-                equipment.set_attrs()
-
-                if equipment.role in self.conf.nodes_roles:
-                    nodes.append(equipment)
-                else:
-                    hosts.append(equipment)
-                    if equipment.category == 'server':
-                        servers.append(equipment)
-
-        self._gen_zone_hosts(cluster.name, hosts, nodes)
-        self._gen_zone_zones(cluster.name, servers)
+        zone = self.routing.satellites[cluster.name]
+        self._gen_zone_hosts(cluster.name, zone.hosts, zone.nodes)
+        self._gen_zone_zones(cluster.name, zone.endpoints)
         self._copy_zone_conf(cluster.name)
 
-    def _print_diff(self):
+    def _objects_needed(self):
 
-        for root, directories, filenames in os.walk(self.tmpdir.path):
-            for filename in filenames: 
-                path = os.path.join(os.path.relpath(root, self.tmpdir.path),
-                                    filename)
-                src_file = os.path.join(self.tmpdir.path, path)
-                dst_file = os.path.join(self.conf.dir_icinga2, 'zones.d', path)
-                if not os.path.exists(dst_file):
-                    logger.info("new file %s (%s does not exist)", path, dst_file)
-                    continue
-                self._print_diff_file(path, dst_file, src_file)
+        """Returns True if the icinga2 objects of the generated files are
+           required, for semantic diff or icinga2 API push."""
+        return self.conf.diff_format != 'text' or \
+               self.conf.api_url is not None
+
+    def _installed_objects(self):
+
+        from hpci2sync.semdiff import InstalledObjects
+
+        installed = InstalledObjects(
+                      os.path.join(self.conf.dir_cache, 'objects.json'),
+                      self.targets[0].dir_icinga2)
+        installed.load()
+        return installed
+
+    def _save_installed_objects(self):
+
+        installed = self._installed_objects()
+        for staged in self.staging:
+            if staged.objects is not None:
+                installed.update(staged.path, staged.read(), staged.objects)
+        installed.save()
 
-    def _print_diff_file(self, filename, fromfile, tofile):
+    def _print_diff(self, changes=None):
+
+        if self.conf.diff_format != 'text':
+            self._print_semantic_diff(changes)
+            return
+
+        # staged files are diffed against the first target only
+        target = self.targets[0]
+        for staged in self.staging:
+            dst_file = target.dst_file(staged)
+            if not os.path.exists(dst_file):
+                logger.info("new file %s (%s does not exist)",
+                            staged.path, dst_file)
+                continue
+            self._print_diff_file(dst_file, staged)
+
+    def _print_diff_file(self, fromfile, staged):
+
+        import difflib
 
         with open(fromfile) as stream:
             fromlines = stream.readlines()
-        with open(tofile) as stream:
-            tolines = stream.readlines()
+        tolines = staged.readlines()
+        tofile = staged.src or os.path.join('staging', staged.path)
 
         diff = difflib.unified_diff(fromlines, tolines, fromfile, tofile, n=3)
         # print diff
         sys.stdout.writelines(diff)
 
+    def _objects_changes(self):
+
+        """Returns the list of (path, status, objects diff) of the staged
+           files which differ from the installed files, status being new or
+           changed. The objects diff is None for static files and files which
+           cannot be parsed."""
+        from hpci2sync.semdiff import ObjectsDiff, ParseError
+
+        target = self.targets[0]
+        installed = self._installed_objects()
+        changes = []  # list of (path, status, objects diff or None)
+        for staged in self.staging:
+            dst_file = target.dst_file(staged)
+            status = 'changed' if os.path.exists(dst_file) else 'new'
+            diff = None
+            if staged.objects is not None:
+                try:
+                    diff = ObjectsDiff()
+                    diff.compare(installed.objects(staged.path, dst_file),
+                                 staged.objects)
+                except ParseError as err:
+                    logger.warning("unable to parse objects of %s: %s",
+                                   dst_file, err)
+                    diff = None
+            if diff is not None:
+                if diff:
+                    changes.append((staged.path, status, diff))
+            elif status == 'new' or not staged.same(dst_file):
+                changes.append((staged.path, status, None))
+        return changes
+
+    def _print_semantic_diff(self, changes):
+
+        """Print the changes of icinga2 objects between installed and staged
+           files. Static files and files which cannot be parsed are only
+           reported as new or changed."""
+        if self.conf.diff_format == 'json':
+            report = {}
+            for path, status, diff in changes:
+                report[path] = diff.dump() if diff is not None else {}
+                report[path]['status'] = status
+            json.dump(report, sys.stdout, indent=2, sort_keys=True)
+            sys.stdout.write('\n')
+            return
+        for path, status, diff in changes:
+            if diff is not None:
+                sys.stdout.writelines(diff.lines(path))
+            else:
+                sys.stdout.write("%s: %s file\n" % (path, status))
+
+    def _api_requests(self, changes):
+
+        """Returns the list of requests pushing the objects changes through
+           icinga2 API, and True if some changes cannot be pushed and require
+           a reload."""
+        from hpci2sync.api import modifications
+
+        requests = []
+        reload_needed = False
+        for path, status, diff in changes:
+            if diff is None:
+                logger.info("%s file %s requires a reload", status, path)
+                reload_needed = True
+                continue
+            file_requests, unsupported = modifications(diff)
+            requests.extend(file_requests)
+            if unsupported:
+                logger.info("%d objects changes in %s cannot be applied "
+                            "through icinga2 API and require a reload",
+                            unsupported, path)
+                reload_needed = True
+        logger.info("%d objects modifications to push through icinga2 API",
+                    len(requests))
+        return requests, reload_needed
+
+    def _push_api(self, requests):
+
+        """Pushes the requests through icinga2 API, returns True if all
+           requests succeeded."""
+        from hpci2sync.api import ApiClient
+
+        if not requests:
+            return True
+        client = ApiClient(self.conf.api_url,
+                           self.conf.api_user,
+                           self.conf.api_password,
+                           self.conf.api_ca,
+                           self.conf.api_timeout,
+                           self.conf.api_workers,
+                           self.conf.api_batch)
+        failed = 0
+        for request, error in client.push(requests):
+            if error is not None:
+                logger.error("icinga2 API modification of %s %s failed: %s",
+                             request.objtype, request.name, error)
+                failed += 1
+        logger.info("%d objects modified through icinga2 API, %d failed",
+                    len(requests) - failed, failed)
+        return not failed
+
     def _copy_conf(self):
 
-        entry = pwd.getpwnam(self.conf.conf_owner)
-        uid = entry[2]
-        gid = entry[3]
-
-        for root, directories, filenames in os.walk(self.tmpdir.path):
-            for filename in filenames: 
-                path = os.path.join(os.path.relpath(root, self.tmpdir.path),
-                                    filename)
-                src_file = os.path.join(self.tmpdir.path, path)
-                dst_file = os.path.join(self.conf.dir_icinga2, 'zones.d', path)
-                logger.info("copying file %s to %s", src_file, dst_file)
-                shutil.copyfile(src_file, dst_file)
-                os.chown(dst_file, uid, gid)
-                os.chmod(dst_file, 0644)
+        """Installs the staged files on all targets, returns True if all
+           installations succeeded."""
+        from hpci2sync.install import install_targets
+
+        results = install_targets(self.targets, self.staging)
+        for result in results:
+            if not result.ok:
+                logger.error("installation on target %s (%s) failed: %s",
+                             result.target.name, result.target.dir_icinga2,
+                             result.error)
+                continue
+            logger.info("target %s (%s): %d files installed, %d unchanged",
+                        result.target.name, result.target.dir_icinga2,
+                        len(result.installed), len(result.unchanged))
+        return all([ result.ok for result in results ])
@@ -35,17 +35,41 @@ import argparse
 import logging
 logger = logging.getLogger(__name__)
 
+def shard_type(value):
+
+    from hpci2sync.shard import parse_shard
+
+    try:
+        return parse_shard(value)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err))
+
+def shards_count_type(value):
+
+    from hpci2sync.shard import parse_shards_count
+
+    try:
+        return parse_shards_count(value)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err))
+
 def parse_args(conf):
 
     """Parses CLI args, then set debug flag and configuration file path in
        runtime configuration accordingly, and returns the args."""
 
     parser = argparse.ArgumentParser()
-    parser.add_argument('action', choices = ['certs', 'conf', 'cleanup'],
+    parser.add_argument('action',
+                        choices = ['certs', 'conf', 'sync', 'cleanup', 'query',
+                                   'rollback', 'status'],
                         help='program action')
     parser.add_argument('-d', '--debug',
                         help='Enable debug mode',
                         action='store_true')
+    parser.add_argument('--debug-hosts',
+                        help='Log individually the events of the hosts in '
+                             'this nodeset, instead of aggregated',
+                        metavar='NODESET')
     parser.add_argument('--dry-run',
                         help='Dry run mode',
                         action='store_true')
@@ -53,17 +77,81 @@ def parse_args(conf):
                         help='Path to the configuration file',
                         nargs='?',
                         default='/etc/hpci2sync/conf.ini')
+    parser.add_argument('-r', '--rev',
+                        help='Read privatedata from this git revision '
+                             'instead of the working tree')
+    parser.add_argument('--diff',
+                        help='Format of the conf action diff: unified diff '
+                             'of files, or changes of icinga2 objects as '
+                             'text or JSON',
+                        choices=['text', 'semantic', 'json'],
+                        default='text')
+
+    shards = parser.add_argument_group('conf action sharding arguments')
+    shards.add_argument('--shard',
+                        help='Render the zones of the clusters of shard I '
+                             'out of N in shards directory, without '
+                             'installing them',
+                        metavar='I/N',
+                        type=shard_type)
+    shards.add_argument('--merge-shards',
+                        help='Render master zone out of the N shards and '
+                             'install all zones',
+                        metavar='N',
+                        type=shards_count_type)
+
+    rollback = parser.add_argument_group('rollback action arguments')
+    rollback.add_argument('--to',
+                          help='Generation to switch back to, the previous '
+                               'one by default',
+                          type=int)
+
+    query = parser.add_argument_group('query action arguments')
+    query.add_argument('--host',
+                       help='Select host by name or FQDN')
+    query.add_argument('--nodeset',
+                       help='Select hosts in nodeset')
+    query.add_argument('--cluster',
+                       help='Select hosts of cluster')
+    query.add_argument('--role',
+                       help='Select hosts with role')
+    query.add_argument('--profile',
+                       help='Select hosts with profile')
+    query.add_argument('--network',
+                       help='Select hosts connected to network')
+    query.add_argument('--ip',
+                       help='Select hosts with IP address')
+    query.add_argument('--format',
+                       help='Query output format',
+                       choices=['text', 'json'],
+                       default='text')
 
     args = parser.parse_args()
 
+    if (args.shard is not None or args.merge_shards is not None) and \
+       args.action != 'conf':
+        parser.error("sharding is only supported by conf action")
+    if args.shard is not None and args.merge_shards is not None:
+        parser.error("--shard and --merge-shards are mutually exclusive")
+
     if args.debug:
         conf.debug = True
     if args.dry_run:
         conf.dryrun = True
+    conf.debug_hosts = args.debug_hosts
     if args.conf:
         conf.conf_file = args.conf
 
     conf.action = args.action
+    conf.query = dict([ (criterion, getattr(args, criterion))
+                        for criterion in ['host', 'nodeset', 'cluster', 'role',
+                                          'profile', 'network', 'ip']
+                        if getattr(args, criterion) is not None ])
+    conf.query_format = args.format
+    conf.diff_format = args.diff
+    conf.rollback_to = args.to
+    conf.shard = args.shard
+    conf.merge_shards = args.merge_shards
 
     return args
 
@@ -48,7 +48,7 @@ class ClustersSet(object):
 
     def __iter__(self):
 
-        for cluster in self._clusters:
+        for cluster in sorted(self._clusters, key=lambda cluster: cluster.name):
             yield cluster
 
     def add(self, name, prefix):
@@ -57,6 +57,10 @@ class ClustersSet(object):
         self._clusters.add(new_cluster)
         return new_cluster
 
+    def discard(self, name):
+
+        self._clusters.discard(Cluster(name, None))
+
     def get(self, name): 
         for cluster in self._clusters:
             if cluster.name == name:
@@ -71,6 +75,7 @@ class Cluster(object):
         self.name = name
         self.prefix = prefix
         self.equipments = set()
+        self._index = {}  # equipment name -> equipment
 
     def __eq__(self, other):
 
@@ -82,19 +87,25 @@ class Cluster(object):
 
     def __contains__(self, name):
 
-        return Equipment(name) in self.equipments
+        return name in self._index
 
     def __iter__(self):
 
         for equipment in sorted(self.equipments, key=lambda equipment: equipment.name):
             yield equipment
 
+    def add_equipment(self, equipment):
+
+        # as for the set, the first equipment added with a name is kept
+        if equipment.name not in self._index:
+            self.equipments.add(equipment)
+            self._index[equipment.name] = equipment
+
     def get_equipment(self, name):
-        for equipment in self.equipments:
-            if equipment.name == name:
-                return equipment
-        raise KeyError("equipment %s not found in cluster %s"
-                       % (name, self.name))
+        if name not in self._index:
+            raise KeyError("equipment %s not found in cluster %s"
+                           % (name, self.name))
+        return self._index[name]
  
 class Netif(object):
 
@@ -112,7 +123,9 @@ class Equipment(object):
         self.fqdn = None
         self.category = None
         self.model = None
-        self.netifs = set()
+        self.netifs = []  # in network name order
+        # the hieradata network file the equipment fqdn and netifs come from
+        self.netsource = None
         # the following attributes are only set for server category
         self.role = None
         self.profiles = None
@@ -136,11 +149,10 @@ class Equipment(object):
         if not match:
             raise RuntimeError
         self.role = match.group(1)
-        logger.debug("role of %s is %s", self.name, self.role)
 
     def add_netif(self, network, ip):
 
-        self.netifs.add(Netif(network, ip))
+        self.netifs.append(Netif(network, ip))
 
     def get_ip_netif(self, role):
 
@@ -194,7 +206,7 @@ class NetworksSet(object):
 
     def __init__(self):
 
-        self._networks = set()
+        self._networks = []  # in addition order, the first one wins
 
     def __contains__(self, network_name):
 
@@ -202,7 +214,7 @@ class NetworksSet(object):
 
     def add(self, role, name):
 
-        self._networks.add(Network(role, name))
+        self._networks.append(Network(role, name))
 
     def get(self, name): 
         for network in self._networks:
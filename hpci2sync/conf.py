@@ -34,7 +34,10 @@
 import logging
 logger = logging.getLogger(__name__)
 
-import ConfigParser
+try:
+    from configparser import ConfigParser as SafeConfigParser
+except ImportError:  # python 2
+    from ConfigParser import SafeConfigParser
 from io import StringIO
 
 class ConfRun(object):
@@ -43,9 +46,16 @@ class ConfRun(object):
     def __init__(self):
 
         self.debug = False
+        self.debug_hosts = None
         self.dryrun = False
         self.conf_file = None
         self.action = None
+        self.query = {}
+        self.query_format = None
+        self.diff_format = 'text'
+        self.rollback_to = None
+        self.shard = None
+        self.merge_shards = None
 
         self.dir_icinga2 = None
         self.dir_ca = None
@@ -55,6 +65,9 @@ class ConfRun(object):
         self.dir_equipments = None
         self.dir_conf = None
         self.dir_tmp = None
+        self.dir_cache = None
+        self.dir_shards = None
+        self.revision = None
         self.file_cluster = None
         self.file_hosts = None
         self.file_keys = None
@@ -68,20 +81,46 @@ class ConfRun(object):
         # certs params
         self.exclude_clusters = []
         self.nodes_roles = []
+        self.conflicts = None
 
         # conf params
         self.profs_master = []
         self.prof_monsat = None
         self.dir_templates = None
+        self.renderer = None
+        self.compact_nodes = False
+        self.shared_templates = False
         self.conf_owner = None
+        self.targets = []
+        self.staging_mode = None
+        self.staging_spill = None
+        self.cache_size = None
+        self.generations = None
+        self.pipeline = False
+
+        # api params
+        self.api_url = None
+        self.api_user = None
+        self.api_password = None
+        self.api_ca = None
+        self.api_workers = None
+        self.api_batch = None
+        self.api_timeout = None
 
     def dump(self):
 
         logger.debug("runtime configuration dump:")
         logger.debug("- debug: %s", str(self.debug))
+        logger.debug("- debug_hosts: %s", str(self.debug_hosts))
         logger.debug("- dryrun: %s", str(self.dryrun))
         logger.debug("- conf_file: %s", str(self.conf_file))
         logger.debug("- action: %s", str(self.action))
+        logger.debug("- query: %s", str(self.query))
+        logger.debug("- query_format: %s", str(self.query_format))
+        logger.debug("- diff_format: %s", str(self.diff_format))
+        logger.debug("- rollback_to: %s", str(self.rollback_to))
+        logger.debug("- shard: %s", str(self.shard))
+        logger.debug("- merge_shards: %s", str(self.merge_shards))
         logger.debug("- dir_icinga2: %s", str(self.dir_icinga2))
         logger.debug("- dir_ca: %s", str(self.dir_ca))
         logger.debug("- dir_crtdst: %s", str(self.dir_crtdst))
@@ -90,6 +129,9 @@ class ConfRun(object):
         logger.debug("- dir_equipments: %s", str(self.dir_equipments))
         logger.debug("- dir_conf: %s", str(self.dir_conf))
         logger.debug("- dir_tmp: %s", str(self.dir_tmp))
+        logger.debug("- dir_cache: %s", str(self.dir_cache))
+        logger.debug("- dir_shards: %s", str(self.dir_shards))
+        logger.debug("- revision: %s", str(self.revision))
         logger.debug("- net_adm: %s", str(self.net_adm))
         logger.debug("- net_wan: %s", str(self.net_wan))
         logger.debug("- net_mgt: %s", str(self.net_mgt))
@@ -98,10 +140,26 @@ class ConfRun(object):
         logger.debug("- file_keys: %s", str(self.file_keys))
         logger.debug("- exclude_clusters: %s", str(self.exclude_clusters))
         logger.debug("- nodes_roles: %s", str(self.nodes_roles))
+        logger.debug("- conflicts: %s", str(self.conflicts))
         logger.debug("- profs_master: %s", str(self.profs_master))
         logger.debug("- prof_monsat: %s", str(self.prof_monsat))
         logger.debug("- dir_templates: %s", str(self.dir_templates))
+        logger.debug("- renderer: %s", str(self.renderer))
+        logger.debug("- compact_nodes: %s", str(self.compact_nodes))
+        logger.debug("- shared_templates: %s", str(self.shared_templates))
         logger.debug("- conf_owner: %s", str(self.conf_owner))
+        logger.debug("- targets: %s", str(self.targets))
+        logger.debug("- staging_mode: %s", str(self.staging_mode))
+        logger.debug("- staging_spill: %s", str(self.staging_spill))
+        logger.debug("- cache_size: %s", str(self.cache_size))
+        logger.debug("- generations: %s", str(self.generations))
+        logger.debug("- pipeline: %s", str(self.pipeline))
+        logger.debug("- api_url: %s", str(self.api_url))
+        logger.debug("- api_user: %s", str(self.api_user))
+        logger.debug("- api_ca: %s", str(self.api_ca))
+        logger.debug("- api_workers: %s", str(self.api_workers))
+        logger.debug("- api_batch: %s", str(self.api_batch))
+        logger.debug("- api_timeout: %s", str(self.api_timeout))
 
     def parse(self):
 
@@ -117,6 +175,9 @@ class ConfRun(object):
           "equipments = %(privatedata)s/monitoring/equipments\n"
           "conf = %(privatedata)s/monitoring/conf\n"
           "tmp = /tmp/hpci2sync\n"
+          "cache = /var/cache/hpci2sync\n"
+          "shards = %(cache)s/shards\n"
+          "revision = \n"
           "cluster = cluster.yaml\n"
           "hosts = network.yaml\n"
           "keys = /etc/hpci2sync/keys.ini\n"
@@ -133,9 +194,30 @@ class ConfRun(object):
           "profiles_master = virt::host\n"
           "profile_monsat = monitoring::server\n"
           "templates = /etc/hpci2sync/templates\n"
-          "owner = nagios\n")
-        parser = ConfigParser.SafeConfigParser()
-        parser.readfp(defaults)
+          "renderer = jinja2\n"
+          "compact_nodes = no\n"
+          "shared_templates = no\n"
+          "owner = nagios\n"
+          "targets = \n"
+          "staging = memory\n"
+          "staging_spill = 67108864\n"
+          "cache_size = 100000\n"
+          "generations = 0\n"
+          "pipeline = no\n"
+          "conflicts = warn\n"
+          "[api]\n"
+          "url = \n"
+          "user = root\n"
+          "password = \n"
+          "ca = \n"
+          "workers = 4\n"
+          "batch = 100\n"
+          "timeout = 10\n")
+        parser = SafeConfigParser()
+        if hasattr(parser, 'read_file'):
+            parser.read_file(defaults)
+        else:  # python 2
+            parser.readfp(defaults)
         parser.read(self.conf_file)
         self.dir_icinga2 = parser.get('paths', 'icinga2')
         self.dir_ca = parser.get('paths', 'ca')
@@ -145,6 +227,9 @@ class ConfRun(object):
         self.dir_equipments = parser.get('paths', 'equipments')
         self.dir_conf = parser.get('paths', 'conf')
         self.dir_tmp = parser.get('paths', 'tmp')
+        self.dir_cache = parser.get('paths', 'cache')
+        self.dir_shards = parser.get('paths', 'shards')
+        self.revision = parser.get('paths', 'revision').strip() or None
         self.net_adm = parser.get('networks', 'administration')
         self.net_wan = parser.get('networks', 'wan')
         self.net_mgt = parser.get('networks', 'management')
@@ -159,8 +244,69 @@ class ConfRun(object):
         self.prof_monsat = parser.get('conf', 'profile_monsat')
         self.profs_master.append(self.prof_monsat)
         self.dir_templates = parser.get('conf', 'templates')
+        self.renderer = parser.get('conf', 'renderer')
+        if self.renderer not in ['jinja2', 'native']:
+            raise ValueError("invalid renderer %s" % (self.renderer))
+        self.compact_nodes = parser.getboolean('conf', 'compact_nodes')
+        self.shared_templates = parser.getboolean('conf', 'shared_templates')
         self.conf_owner = parser.get('conf', 'owner')
+        self.parse_targets(parser)
+        self.staging_mode = parser.get('conf', 'staging')
+        self.staging_spill = parser.getint('conf', 'staging_spill')
+        self.cache_size = parser.getint('conf', 'cache_size')
+        self.generations = parser.getint('conf', 'generations')
+        self.pipeline = parser.getboolean('conf', 'pipeline')
+        self.parse_conflicts(parser)
+        self.api_url = parser.get('api', 'url').strip() or None
+        self.api_user = parser.get('api', 'user')
+        self.api_password = parser.get('api', 'password')
+        self.api_ca = parser.get('api', 'ca').strip() or None
+        self.api_workers = parser.getint('api', 'workers')
+        self.api_batch = parser.getint('api', 'batch')
+        self.api_timeout = parser.getint('api', 'timeout')
+
+    def parse_conflicts(self, parser):
+
+        """Set the conflicts policy, formerly set in networks section which is
+           still honoured with a warning. Raises ValueError if the policy is
+           not warn, fail or ignore."""
+        if parser.has_option('networks', 'conflicts'):
+            logger.warning("conflicts parameter in networks section is "
+                           "deprecated, it must be set in conf section")
+            self.conflicts = parser.get('networks', 'conflicts')
+        else:
+            self.conflicts = parser.get('conf', 'conflicts')
+        if self.conflicts not in ['warn', 'fail', 'ignore']:
+            raise ValueError("invalid conflicts policy %s" % (self.conflicts))
+
+    def parse_targets(self, parser):
+
+        """Set the list of install targets as (name, icinga2 dir, owner)
+           tuples. Every target listed in targets parameter has its own
+           target:<name> section, defaulting to icinga2 path and owner. With
+           no targets listed, there is a unique target named default."""
+        names = [ name.strip()
+                  for name in parser.get('conf', 'targets').split(',')
+                  if name.strip() ]
+        if not names:
+            self.targets = [ ('default', self.dir_icinga2, self.conf_owner) ]
+            return
+        self.targets = []
+        for name in names:
+            section = 'target:' + name
+            dir_icinga2 = self.dir_icinga2
+            owner = self.conf_owner
+            if parser.has_section(section):
+                if parser.has_option(section, 'icinga2'):
+                    dir_icinga2 = parser.get(section, 'icinga2')
+                if parser.has_option(section, 'owner'):
+                    owner = parser.get(section, 'owner')
+            else:
+                logger.warning("section %s not found for install target %s",
+                               section, name)
+            self.targets.append((name, dir_icinga2, owner))
 
     def override(self, args):
         """Override configuration files parameters with args values."""
-        pass
+        if args.rev:
+            self.revision = args.rev
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+import logging
+logger = logging.getLogger(__name__)
+
+class ConflictsDetector(object):
+    """Detects equipments sharing the same IP address on the same network and
+       equipments sharing the same FQDN, in all clusters. All equipments are
+       indexed in hash tables in one pass, so detection runs in linear
+       time."""
+
+    def __init__(self):
+
+        self._ips = {}  # (network, ip) -> first equipment
+        self._fqdns = {}  # fqdn -> first equipment
+        # conflict key -> list of (cluster name, equipment, source) tuples
+        self.ip_conflicts = {}
+        self.fqdn_conflicts = {}
+
+    def __len__(self):
+
+        return len(self.ip_conflicts) + len(self.fqdn_conflicts)
+
+    def check(self, clusters):
+
+        for cluster in clusters:
+            self.add_cluster(cluster)
+        return len(self)
+
+    def add_cluster(self, cluster):
+
+        for equipment in cluster:
+            owner = (cluster.name, equipment.name, equipment.netsource)
+            if equipment.fqdn is not None:
+                self._index(self._fqdns, self.fqdn_conflicts, equipment.fqdn,
+                            owner)
+            for netif in equipment.netifs:
+                self._index(self._ips, self.ip_conflicts,
+                            (netif.network.name, netif.ip), owner)
+
+    @staticmethod
+    def _index(index, conflicts, key, owner):
+
+        if key not in index:
+            index[key] = owner
+            return
+        if key not in conflicts:
+            conflicts[key] = [index[key]]
+        conflicts[key].append(owner)
+
+    @staticmethod
+    def _owners(owners):
+
+        return ', '.join([ "%s/%s (%s)" % owner for owner in owners ])
+
+    def report(self, log=logger.error):
+
+        for (network, ip), owners in sorted(self.ip_conflicts.items(),
+                                            key=lambda item: str(item[0])):
+            log("IP address %s on network %s is shared by: %s",
+                ip, network, self._owners(owners))
+        for fqdn, owners in sorted(self.fqdn_conflicts.items()):
+            log("FQDN %s is shared by: %s", fqdn, self._owners(owners))
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+"""Native emitter of icinga2 configuration DSL objects, producing the same
+   output as the default Jinja2 templates without going through a template
+   engine, with proper escaping of strings and arrays."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import re
+import hashlib
+
+try:
+    string_types = basestring
+except NameError:  # python 3
+    string_types = str
+
+ESCAPES = [ ('\\', '\\\\'),
+            ('"', '\\"'),
+            ('\n', '\\n'),
+            ('\r', '\\r'),
+            ('\t', '\\t'),
+            ('\b', '\\b'),
+            ('\f', '\\f') ]
+
+def text(value):
+
+    if isinstance(value, string_types):
+        return value
+    return str(value)
+
+
+def string(value):
+
+    """Returns value as an icinga2 string literal."""
+    value = text(value)
+    for char, escaped in ESCAPES:
+        if char in value:
+            value = value.replace(char, escaped)
+    return '"' + value + '"'
+
+
+def literal(value):
+
+    """Returns the icinga2 literal of a Python value."""
+    if isinstance(value, string_types):
+        return string(value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if value is None:
+        return 'null'
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join([ literal(item) for item in value ]) + ']'
+    if isinstance(value, dict):
+        if not value:
+            return '{}'
+        return '{ ' + ', '.join([ "%s = %s" % (string(key), literal(item))
+                                  for key, item in sorted(value.items()) ]) \
+               + ' }'
+    return str(value)
+
+
+class NativeEmitter(object):
+    """Emits Host, Endpoint and Zone objects out of equipments. The digest
+       identifies the output format in fragments cache keys, it must be
+       changed with the emitted format.
+
+       With shared templates, the vars which are not host specific are set
+       in Host templates computed per zone and set of vars, and imported by
+       the hosts."""
+
+    IMPORTS = { 'equipment': 'hpc-equipment',
+                'node': 'hpc-compute-node' }
+
+    # vars set inline in hosts objects with shared templates
+    HOST_SPECIFIC = frozenset(['bmc'])
+
+    def __init__(self, shared_templates=False):
+
+        self.shared_templates = shared_templates
+        if shared_templates:
+            self.digest = 'native-1-shared'
+        else:
+            self.digest = 'native-1'
+
+    def template(self, zone, host, kind):
+
+        """Returns the name of the shared template of host in zone, and the
+           dict of vars it sets."""
+        shared = dict([ (key, value) for key, value in host.attrs.items()
+                        if key not in self.HOST_SPECIFIC ])
+        blob = kind + ' ' + literal(shared)
+        digest = hashlib.sha1(blob.encode('utf-8')).hexdigest()
+        return 'hpc-%s-%s' % (zone, digest[:10]), shared
+
+    def templates(self, zone, hosts, kind):
+
+        """Returns the shared templates objects of all hosts in zone."""
+        templates = {}
+        for host in hosts:
+            name, shared = self.template(zone, host, kind)
+            if name in templates:
+                continue
+            lines = [ '',
+                      'template Host %s {' % (string(name)),
+                      '  import %s' % (string(self.IMPORTS[kind])) ]
+            lines.extend(self._vars(shared))
+            lines.append('}')
+            lines.append('')
+            templates[name] = '\n'.join(lines)
+        return ''.join([ templates[name] for name in sorted(templates) ])
+
+    @staticmethod
+    def _vars(attrs):
+
+        return [ '  vars.%s = %s' % (key, literal(attrs[key]))
+                 for key in sorted(attrs.keys(), key=lambda key: key.lower()) ]
+
+    def host(self, host, kind, zone=None):
+
+        """Returns the Host object of host, kind being either equipment or
+           node. The zone is required with shared templates."""
+        if self.shared_templates:
+            imported, shared = self.template(zone, host, kind)
+        else:
+            imported, shared = self.IMPORTS[kind], {}
+        lines = [ '',
+                  'object Host %s {' % (string(host.fqdn)),
+                  '  import %s' % (string(imported)),
+                  '  display_name = %s' % (string(host.name)),
+                  '  address = %s' % (string(host.ip)) ]
+        lines.extend(self._vars(dict([ (key, value)
+                                       for key, value in host.attrs.items()
+                                       if key not in shared ])))
+        if kind == 'equipment' and host.category == 'server':
+            lines.append('  vars.client_endpoint = name')
+        lines.append('}')
+        lines.append('')
+        return '\n'.join(lines)
+
+    def nodes(self, zone, nodes):
+
+        """Returns the compact form of the Host objects of compute nodes: the
+           vars shared by all nodes, a dictionary of nodes specific data and a
+           loop creating the Host objects out of them. The objects are the
+           same as the ones emitted by host()."""
+        var = 'hpc_nodes_' + re.sub(r'[^A-Za-z0-9_]', '_', zone)
+        shared = dict(nodes[0].attrs)
+        for node in nodes[1:]:
+            for key in list(shared.keys()):
+                if key not in node.attrs or node.attrs[key] != shared[key]:
+                    del shared[key]
+        lines = [ '',
+                  'var %s_vars = %s' % (var, literal(shared)),
+                  'var %s = {' % (var) ]
+        for node in nodes:
+            specific = dict([ (key, value)
+                              for key, value in node.attrs.items()
+                              if key not in shared ])
+            lines.append('  %s = { display_name = %s, address = %s, '
+                         'vars = %s }'
+                         % (string(node.fqdn), string(node.name),
+                            string(node.ip), literal(specific)))
+        lines.extend([ '}',
+                       '',
+                       'for (node_name => node in %s) {' % (var),
+                       '  object Host node_name use (node, %s_vars) {' % (var),
+                       '    import %s' % (string(self.IMPORTS['node'])),
+                       '    display_name = node.display_name',
+                       '    address = node.address',
+                       '    vars += %s_vars' % (var),
+                       '    vars += node.vars',
+                       '  }',
+                       '}',
+                       '' ])
+        return '\n'.join(lines)
+
+    def zones(self, hosts, parent):
+
+        """Returns the Endpoint and Zone objects of all hosts, with parent
+           zone."""
+        blocks = []
+        for host in hosts:
+            fqdn = string(host.fqdn)
+            blocks.append('\n'.join([ '',
+                                      'object Endpoint %s {' % (fqdn),
+                                      '  host = %s' % (string(host.ip)),
+                                      '}',
+                                      '',
+                                      'object Zone %s {' % (fqdn),
+                                      '  parent = %s' % (string(parent)),
+                                      '  endpoints = [ %s ]' % (fqdn),
+                                      '}',
+                                      '' ]))
+        return ''.join(blocks)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import json
+import hashlib
+
+class FragmentsCache(object):
+    """Persistent cache of the configuration fragments rendered for every
+       single host, keyed by a digest of all the data used to render it.
+       Least recently used fragments are evicted when the cache exceeds its
+       maximum number of entries."""
+
+    def __init__(self, path, size):
+
+        self.path = path
+        self.size = size
+        self.run = 0
+        self.entries = {}  # digest -> [last run, fragment]
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+
+        return self.size > 0
+
+    def load(self):
+
+        if not self.enabled or not os.path.exists(self.path):
+            return
+        logger.debug("loading fragments cache %s", self.path)
+        try:
+            with open(self.path, 'r') as stream:
+                data = json.load(stream)
+            self.run = data['run']
+            self.entries = data['entries']
+        except (IOError, ValueError, KeyError) as exc:
+            logger.warning("unable to load fragments cache %s, starting "
+                           "with empty cache: %s", self.path, exc)
+            self.entries = {}
+        self.run += 1
+
+    def key(self, host, template, kind):
+
+        """Returns the digest of host data, template digest and host kind
+           (equipment or node), or None if the cache is disabled."""
+        if not self.enabled:
+            return None
+        data = [ host.fqdn, host.name, host.ip, host.attrs, template, kind ]
+        blob = json.dumps(data, sort_keys=True)
+        return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[0] = self.run
+        return entry[1]
+
+    def set(self, key, fragment):
+
+        if self.enabled:
+            self.entries[key] = [self.run, fragment]
+
+    def _evict(self):
+
+        excess = len(self.entries) - self.size
+        if excess <= 0:
+            return
+        logger.debug("evicting %d entries from fragments cache", excess)
+        lru = sorted(self.entries.keys(), key=lambda key: self.entries[key][0])
+        for key in lru[:excess]:
+            del self.entries[key]
+
+    def save(self):
+
+        if not self.enabled:
+            return
+        self._evict()
+        cache_dir = os.path.dirname(self.path)
+        tmp_path = self.path + '.tmp'
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            with open(tmp_path, 'w') as stream:
+                json.dump({ 'run': self.run, 'entries': self.entries }, stream)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as exc:
+            logger.warning("unable to save fragments cache %s: %s",
+                           self.path, exc)
+
+    def report(self):
+
+        total = self.hits + self.misses
+        if not self.enabled or not total:
+            return
+        logger.info("fragments cache: %d hits, %d misses (%.1f%% hit ratio)",
+                    self.hits, self.misses, 100.0 * self.hits / total)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import shutil
+
+class Generations(object):
+    """Snapshots of the zones.d directory of an icinga2 target. Every
+       generation is a directory in zones.gen, zones.d being a symlink to the
+       current one. A new generation is created by hardlinking all the files
+       of the current one, the changed files are then replaced by new files
+       so the previous generations are kept unmodified. Switching from one
+       generation to another is an atomic replacement of the symlink."""
+
+    def __init__(self, dir_icinga2, retention):
+
+        self.dir_zones = os.path.join(dir_icinga2, 'zones.d')
+        self.dir_gens = os.path.join(dir_icinga2, 'zones.gen')
+        self.retention = retention
+
+    def _path(self, gen):
+
+        return os.path.join(self.dir_gens, str(gen))
+
+    def list(self):
+
+        """Returns the sorted list of existing generations numbers."""
+        if not os.path.isdir(self.dir_gens):
+            return []
+        return sorted([ int(name) for name in os.listdir(self.dir_gens)
+                        if name.isdigit() ])
+
+    def current(self):
+
+        """Returns the current generation number, or None if zones.d is not
+           a generation symlink."""
+        if not os.path.islink(self.dir_zones):
+            return None
+        return int(os.path.basename(os.readlink(self.dir_zones)))
+
+    def _migrate(self):
+
+        """Turn the zones.d directory into the first generation."""
+        logger.info("moving %s to first generation in %s",
+                    self.dir_zones, self.dir_gens)
+        if not os.path.isdir(self.dir_gens):
+            os.makedirs(self.dir_gens)
+        os.rename(self.dir_zones, self._path(1))
+        self.switch(1)
+
+    def prepare(self):
+
+        """Creates a new generation out of the current one and returns its
+           number and its directory."""
+        if self.current() is None:
+            self._migrate()
+        current = self.current()
+        gen = max(self.list()) + 1
+        src_dir = self._path(current)
+        dst_dir = self._path(gen)
+        logger.debug("creating generation %d out of generation %d",
+                     gen, current)
+        for dirpath, dirnames, filenames in os.walk(src_dir):
+            dst_path = os.path.normpath(
+                         os.path.join(dst_dir,
+                                      os.path.relpath(dirpath, src_dir)))
+            os.mkdir(dst_path)
+            shutil.copystat(dirpath, dst_path)
+            for filename in filenames:
+                os.link(os.path.join(dirpath, filename),
+                        os.path.join(dst_path, filename))
+        return gen, dst_dir
+
+    def switch(self, gen):
+
+        """Atomically makes gen the current generation."""
+        tmp_link = self.dir_zones + '.tmp'
+        if os.path.lexists(tmp_link):
+            os.unlink(tmp_link)
+        os.symlink(os.path.join(os.path.basename(self.dir_gens), str(gen)),
+                   tmp_link)
+        os.rename(tmp_link, self.dir_zones)
+        logger.info("generation %d is now current in %s", gen, self.dir_zones)
+
+    def discard(self, gen):
+
+        shutil.rmtree(self._path(gen), ignore_errors=True)
+
+    def prune(self):
+
+        """Removes the oldest generations beyond retention, but never the
+           current one."""
+        current = self.current()
+        gens = self.list()
+        for gen in gens[:max(len(gens) - self.retention, 0)]:
+            if gen == current:
+                continue
+            logger.debug("removing generation %d", gen)
+            self.discard(gen)
+
+    def previous(self, gen=None):
+
+        """Returns the generation to roll back to: gen if it exists, or the
+           one preceding the current generation by default. Raises ValueError
+           if there is no such generation."""
+        current = self.current()
+        gens = self.list()
+        if current is None or not gens:
+            raise ValueError("no generation in %s" % (self.dir_gens))
+        if gen is None:
+            previous = [ other for other in gens if other < current ]
+            if not previous:
+                raise ValueError("no generation before current generation %d"
+                                 % (current))
+            gen = previous[-1]
+        elif gen not in gens:
+            raise ValueError("generation %d not found in %s"
+                             % (gen, self.dir_gens))
+        return gen
@@ -36,21 +36,219 @@ logger = logging.getLogger(__name__)
 
 import os
 import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+from yaml.events import (MappingStartEvent, MappingEndEvent,
+                         SequenceStartEvent, SequenceEndEvent,
+                         ScalarEvent, AliasEvent)
+from yaml.composer import ComposerError
+
+from hpci2sync.hostlog import HostsLog
+from hpci2sync.shard import in_shard
+
+
+class StreamingUnsupported(Exception):
+    """Raised by NetworkExtractor on YAML features it cannot stream."""
+
+
+class NetworkExtractor(object):
+    """Streaming extractor of hosts data out of hieradata network file. The
+       YAML events are consumed one by one and only the fqdn and the IP
+       addresses of the hosts found in master_network are kept, everything
+       else is discarded as it goes. Anchors, aliases and merge keys cannot
+       be resolved this way, the file is then loaded with safe_load."""
+
+    MERGE_TAG = 'tag:yaml.org,2002:merge'
+
+    def __init__(self, stream):
+
+        self.stream = stream
+        self.loader = SafeLoader(stream)
+
+    def extract(self, known=None):
+
+        """Returns the list of (host, params) tuples of master_network, in
+           file order. If known is given, the params of the hosts not in
+           known are not built and set to None. As with safe_load, a host
+           defined twice keeps its first position and its last params.
+           Raises KeyError if master_network is not found."""
+        try:
+            return self._extract(known)
+        except StreamingUnsupported as exc:
+            logger.debug("unable to stream network file: %s, loading it "
+                         "entirely", exc)
+        finally:
+            self.loader.dispose()
+        self.stream.seek(0)
+        hosts = yaml.load(self.stream, Loader=SafeLoader)['master_network']
+        return [ (host, params if known is None or host in known else None)
+                 for host, params in hosts.items() ]
+
+    def _extract(self, known):
+
+        self._event()  # StreamStartEvent
+        self._event()  # DocumentStartEvent
+        if not self.loader.check_event(MappingStartEvent):
+            raise KeyError('master_network')
+        self._event()
+        while not self.loader.check_event(MappingEndEvent):
+            key = self._scalar()
+            if key == 'master_network':
+                return self._hosts(known)
+            self._skip()
+        raise KeyError('master_network')
+
+    def _hosts(self, known):
+
+        hosts = []
+        positions = {}  # host -> position in hosts
+        self._expect(MappingStartEvent)
+        while not self.loader.check_event(MappingEndEvent):
+            host = self._scalar()
+            if known is None or host in known:
+                params = self._params()
+            else:
+                params = None
+                self._skip()
+            if host in positions:
+                hosts[positions[host]] = (host, params)
+            else:
+                positions[host] = len(hosts)
+                hosts.append((host, params))
+        self._event()
+        return hosts
+
+    def _params(self):
+
+        if not self.loader.check_event(MappingStartEvent):
+            return self._value()
+        params = {}
+        self._event()
+        while not self.loader.check_event(MappingEndEvent):
+            key = self._scalar()
+            if key == 'fqdn':
+                params[key] = self._value()
+            elif key == 'networks':
+                params[key] = self._networks()
+            else:
+                self._skip()
+        self._event()
+        return params
+
+    def _networks(self):
+
+        if not self.loader.check_event(MappingStartEvent):
+            return self._value()
+        networks = {}
+        self._event()
+        while not self.loader.check_event(MappingEndEvent):
+            net_name = self._scalar()
+            if not self.loader.check_event(MappingStartEvent):
+                networks[net_name] = self._value()
+                continue
+            net_settings = {}
+            self._event()
+            while not self.loader.check_event(MappingEndEvent):
+                key = self._scalar()
+                if key == 'IP':
+                    net_settings[key] = self._value()
+                else:
+                    self._skip()
+            self._event()
+            networks[net_name] = net_settings
+        self._event()
+        return networks
+
+    def _event(self):
+
+        """Returns the next event. Raises StreamingUnsupported on anchors
+           and aliases, as skipped anchored nodes could be referenced
+           later."""
+        event = self.loader.get_event()
+        if isinstance(event, AliasEvent):
+            raise StreamingUnsupported("alias %s" % (event.anchor))
+        if getattr(event, 'anchor', None) is not None:
+            raise StreamingUnsupported("anchor %s" % (event.anchor))
+        return event
+
+    def _expect(self, event_class):
+
+        event = self._event()
+        if not isinstance(event, event_class):
+            raise ComposerError(None, None,
+                                "expected %s, but found %s"
+                                % (event_class.__name__,
+                                   event.__class__.__name__),
+                                event.start_mark)
+        return event
+
+    def _scalar(self):
+
+        event = self._expect(ScalarEvent)
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = self.loader.resolve(yaml.ScalarNode, event.value,
+                                      event.implicit)
+        if tag == self.MERGE_TAG:
+            raise StreamingUnsupported("merge key")
+        node = yaml.ScalarNode(tag, event.value, event.start_mark,
+                               event.end_mark, style=event.style)
+        return self.loader.construct_object(node)
+
+    def _value(self):
+
+        """Builds and returns the value of the next node."""
+        if self.loader.check_event(ScalarEvent):
+            return self._scalar()
+        if self.loader.check_event(SequenceStartEvent):
+            self._event()
+            value = []
+            while not self.loader.check_event(SequenceEndEvent):
+                value.append(self._value())
+            self._event()
+            return value
+        self._expect(MappingStartEvent)
+        value = {}
+        while not self.loader.check_event(MappingEndEvent):
+            key = self._scalar()
+            value[key] = self._value()
+        self._event()
+        return value
+
+    def _skip(self):
+
+        """Consumes all the events of the next node."""
+        depth = 0
+        while True:
+            event = self._event()
+            if isinstance(event, (MappingStartEvent, SequenceStartEvent)):
+                depth += 1
+            elif isinstance(event, (MappingEndEvent, SequenceEndEvent)):
+                depth -= 1
+            if depth == 0:
+                return
+
 
 class Hieradata(object):
 
-    def __init__(self, conf, clusters, networks):
+    def __init__(self, conf, clusters, networks, source):
 
         self.conf = conf
         self.path = self.conf.dir_hieradata
         self.clusters = clusters
         self.networks = networks
+        self.source = source
+        self.hostslog = HostsLog(logger)
 
     def parse(self):
 
         logger.info("parsing hieradata")
-        cluster_dirs = [ found_dir for found_dir in os.listdir(self.path)
-                         if os.path.isdir(os.path.join(self.path, found_dir)) ]
+        cluster_dirs = [ found_dir
+                         for found_dir in self.source.listdir(self.path)
+                         if self.source.isdir(os.path.join(self.path,
+                                                           found_dir)) ]
         logger.debug("discovered clusters: %s", str(cluster_dirs))
         for cluster in cluster_dirs:
             if cluster in self.conf.exclude_clusters:
@@ -58,6 +256,9 @@ class Hieradata(object):
                              cluster)
                 continue  # jump to next cluster iteration
 
+            if not in_shard(cluster, self.conf.shard):
+                continue  # cluster of another shard
+
             if cluster not in self.clusters:
                 logger.warning("cluster %s not found in initialized cluster "
                                "set", cluster)
@@ -71,29 +272,30 @@ class Hieradata(object):
         cluster = self.clusters.get(name)
 
         host_file = os.path.join(self.path, name, self.conf.file_hosts)
-        with open(host_file, 'r') as stream:
+        with self.source.open(host_file) as stream:
             try:
-                data = yaml.load(stream)
-                hosts = data['master_network']
-                logger.debug("hosts: type(%s), len(%d)", type(hosts), len(hosts))
+                hosts = NetworkExtractor(stream).extract(cluster)
+                logger.debug("hosts: len(%d)", len(hosts))
 
-                for host, params in hosts.iteritems():
-                    self.parse_host(cluster, host, params)
+                for host, params in hosts:
+                    self.parse_host(cluster, host, params, host_file)
 
             except yaml.YAMLError as exc:
                 logger.error("error while parsing host file %s: %s",
                              host_file, exc)
+        self.hostslog.flush()
 
-    def parse_host(self, cluster, host, params):
+    def parse_host(self, cluster, host, params, source=None):
 
         if host not in cluster:
-            logger.warning("host %s not found in initialized cluster %s",
-                           host, cluster.name)
+            self.hostslog.warning("host %s not found in initialized cluster "
+                                  "%s", host, cluster.name)
             return
 
         equipment = cluster.get_equipment(host)
 
         equipment.fqdn = params['fqdn']
+        equipment.netsource = source
 
         self.parse_host_netifs(equipment, params['networks'])
         self.parse_host_profiles(cluster, equipment)
@@ -101,23 +303,25 @@ class Hieradata(object):
     def parse_host_netifs(self, equipment, netifs):
 
         if not len(netifs):
-            logger.warning("host %s is not connected to any network",
-                           equipment.name)
+            self.hostslog.warning("host %s is not connected to any network",
+                                  equipment.name)
             return
 
-        for net_name, net_settings in netifs.iteritems():
+        # sorted so that the netifs, and the IP address picked for every
+        # network role, do not depend on the YAML mapping order
+        for net_name, net_settings in sorted(netifs.items()):
 
             # special handling for BMC
             if net_name == self.conf.net_bmc \
                and equipment.category != 'server':
-                logger.error("equipment %s in category %s cannot have a BMC",
-                             equipment.name, equipment.category)
+                self.hostslog.error("equipment %s in category %s cannot have "
+                                    "a BMC", equipment.name,
+                                    equipment.category)
                 continue
 
             if net_name in self.conf.net_exclude:
-                logger.debug("skipping %s netif on network %s because "
-                             "excluded",
-                             equipment.name, net_name)
+                self.hostslog.debug("skipping %s netif on network %s because "
+                                    "excluded", equipment.name, net_name)
                 continue
             
             equipment.add_netif(self.networks.get(net_name),
@@ -126,29 +330,29 @@ class Hieradata(object):
     def parse_host_profiles(self, cluster, equipment):
 
         if equipment.category != 'server':
-            logger.debug("skipping profiles parsing for not server equipment "
-                         "%s", equipment.name)
+            self.hostslog.debug("skipping profiles parsing for not server "
+                                "equipment %s", equipment.name)
             return
         
         role_file = os.path.join(self.path, cluster.name, 'roles',
                                  equipment.role + '.yaml')
 
-        if not os.path.exists(role_file):
-            logger.warning("cannot parse %s profiles because role file %s "
-                           "does not exist",
-                           equipment.name, role_file)
+        if not self.source.exists(role_file):
+            self.hostslog.warning("cannot parse %s profiles because role "
+                                  "file %s does not exist", equipment.name,
+                                  role_file)
             return
 
         prefix = 'profiles::' 
 
-        with open(role_file, 'r') as stream:
+        with self.source.open(role_file) as stream:
             try:
-                data = yaml.load(stream)
-                equipment.profiles = [ profile[len(prefix):]
-                                       for profile in data['profiles']]
-                logger.debug("equipment %s profiles: %s",
-                             equipment.name,
-                             str(equipment.profiles))
+                data = yaml.safe_load(stream)
+                equipment.profiles = sorted([ profile[len(prefix):]
+                                              for profile in data['profiles']])
+                self.hostslog.debug("equipment %s profiles: %s",
+                                    equipment.name,
+                                    str(equipment.profiles))
 
             except yaml.YAMLError as exc:
                 logger.error("error while parsing role file %s: %s",
@@ -161,9 +365,9 @@ class Hieradata(object):
         cluster_file = os.path.join(self.path, cluster, self.conf.file_cluster)
         prefix = None
 
-        with open(cluster_file, 'r') as stream:
+        with self.source.open(cluster_file) as stream:
             try:
-                data = yaml.load(stream)
+                data = yaml.safe_load(stream)
                 prefix = data['cluster_prefix']
                 logger.debug("cluster %s prefix found: %s", cluster, prefix)
 
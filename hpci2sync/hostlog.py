@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+"""Aggregated logging of per host events. Events sharing the same level,
+   message and arguments are logged once with the folded nodeset of all
+   hosts, instead of one line per host. The hosts selected for detail are
+   still logged individually, at least at info level."""
+
+import re
+import logging
+from collections import OrderedDict
+
+# characters with a meaning in nodesets: ranges, operators, groups and
+# wildcards
+NODESET_SYNTAX = re.compile(r'[\[\],!&^@*?\s]')
+
+# names of the hosts logged individually, set at startup before any thread
+# is started and rebound but never modified afterwards
+_detail = frozenset()
+
+def set_detail(nodeset):
+
+    """Select the hosts of nodeset for individual logging."""
+    global _detail
+    from ClusterShell.NodeSet import NodeSet
+    _detail = frozenset(NodeSet(nodeset))
+
+
+class HostsLog(object):
+    """Aggregates per host events of a logger until flushed. The first
+       argument of every message is the host, replaced by the folded nodeset
+       when aggregated. Other arguments must be hashable."""
+
+    def __init__(self, logger):
+
+        self.logger = logger
+        self.events = OrderedDict()  # (level, msg, args) -> list of hosts
+        # folded nodesets of the last lists of hosts, successive events of a
+        # parsing or routing pass usually concern the same hosts. Every
+        # instance has its own cache as passes run in concurrent threads.
+        self.folded = {}
+
+    def log(self, level, msg, host, *args):
+
+        if host in _detail:
+            self.logger.log(max(level, logging.INFO), msg, host, *args)
+            return
+        if not self.logger.isEnabledFor(level):
+            return
+        self.events.setdefault((level, msg, args), []).append(host)
+
+    def debug(self, msg, host, *args):
+
+        self.log(logging.DEBUG, msg, host, *args)
+
+    def warning(self, msg, host, *args):
+
+        self.log(logging.WARNING, msg, host, *args)
+
+    def error(self, msg, host, *args):
+
+        self.log(logging.ERROR, msg, host, *args)
+
+    def fold(self, hosts):
+
+        """Returns the folded nodeset of the list of hosts. The hosts are
+           names read from inventory files, they are only joined when some
+           name cannot be parsed as a nodeset."""
+        key = tuple(hosts)
+        folded = self.folded.get(key)
+        if folded is None:
+            from ClusterShell.NodeSet import NodeSet, NodeSetParseError
+            if len(self.folded) > 64:
+                self.folded.clear()
+            folded = None
+            if not any([ NODESET_SYNTAX.search(host) for host in hosts ]):
+                try:
+                    # parsing the joined names is faster than
+                    # NodeSet.fromlist()
+                    folded = str(NodeSet(','.join(hosts)))
+                except NodeSetParseError:
+                    pass
+            if folded is None:
+                folded = ', '.join(sorted(hosts))
+            self.folded[key] = folded
+        return folded
+
+    def flush(self):
+
+        for (level, msg, args), hosts in self.events.items():
+            self.logger.log(level, msg, self.fold(hosts), *args)
+        self.events.clear()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import sqlite3
+
+from hpci2sync.state import tree_signature
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE hosts (id INTEGER PRIMARY KEY, name TEXT, fqdn TEXT,
+                    cluster TEXT, category TEXT, role TEXT, model TEXT,
+                    zone TEXT, ip TEXT);
+CREATE TABLE netifs (host INTEGER, network TEXT, role TEXT, ip TEXT);
+CREATE TABLE profiles (host INTEGER, profile TEXT);
+CREATE INDEX hosts_name ON hosts (name);
+CREATE INDEX hosts_fqdn ON hosts (fqdn);
+CREATE INDEX hosts_cluster ON hosts (cluster);
+CREATE INDEX hosts_role ON hosts (role);
+CREATE INDEX netifs_host ON netifs (host);
+CREATE INDEX netifs_network ON netifs (network);
+CREATE INDEX netifs_ip ON netifs (ip);
+CREATE INDEX profiles_host ON profiles (host);
+CREATE INDEX profiles_profile ON profiles (profile);
+"""
+
+# columns joined to hosts rows in queries
+HOST_JOINED = [ 'netif_network', 'netif_ip', 'profile' ]
+
+def inputs_signature(conf, source):
+
+    """Returns a digest of the stat data of all the input files the index
+       depends on: configuration file, equipments and hieradata files, or
+       the commit of privatedata git source."""
+    if not source.ondisk:
+        return source.commit
+    return tree_signature([ conf.conf_file, conf.dir_equipments,
+                            conf.dir_hieradata ], source)
+
+
+class InventoryIndex(object):
+    """Persistent SQLite index of the parsed inventory, with the zone and the
+       IP address of every host in the generated configuration."""
+
+    def __init__(self, path):
+
+        self.path = path
+        self.db = None
+
+    def open(self):
+
+        index_dir = os.path.dirname(self.path)
+        if not os.path.isdir(index_dir):
+            os.makedirs(index_dir)
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+
+    def close(self):
+
+        self.db.close()
+        self.db = None
+
+    def signature(self):
+
+        """Returns the inputs signature the index was built with, or None if
+           the index is empty or invalid."""
+        try:
+            row = self.db.execute("SELECT value FROM meta "
+                                  "WHERE key = 'signature'").fetchone()
+        except sqlite3.DatabaseError:
+            return None
+        if row is None:
+            return None
+        return row[0]
+
+    def rebuild(self, clusters, routing, signature):
+
+        """Rebuild the index out of the clusters set, with hosts zones given by
+           the zones routing of the clusters. Equipments compare by name
+           only, so zones are keyed by cluster and equipment names. All
+           equipments are routed, those outside satellite zones are
+           monitored by master."""
+        logger.info("rebuilding inventory index %s", self.path)
+        zones = {}  # (cluster name, equipment name) -> zone
+        for name, satellite in routing.satellites.items():
+            for equipment in satellite.hosts + satellite.nodes:
+                zones[(name, equipment.name)] = name
+
+        self.close()
+        tmp_path = self.path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        db = sqlite3.connect(tmp_path)
+        db.executescript(SCHEMA)
+        host_id = 0
+        for cluster in clusters:
+            for equipment in cluster:
+                host_id += 1
+                db.execute("INSERT INTO hosts VALUES (?,?,?,?,?,?,?,?,?)",
+                           (host_id, equipment.name, equipment.fqdn,
+                            cluster.name, equipment.category, equipment.role,
+                            equipment.model,
+                            zones.get((cluster.name, equipment.name),
+                                      'master'),
+                            equipment.ip))
+                db.executemany("INSERT INTO netifs VALUES (?,?,?,?)",
+                               [ (host_id, netif.network.name,
+                                  netif.network.role, netif.ip)
+                                 for netif in equipment.netifs ])
+                if equipment.profiles is not None:
+                    db.executemany("INSERT INTO profiles VALUES (?,?)",
+                                   [ (host_id, profile)
+                                     for profile in equipment.profiles ])
+        db.execute("INSERT INTO meta VALUES ('signature', ?)", (signature,))
+        db.commit()
+        db.close()
+        os.rename(tmp_path, self.path)
+        self.open()
+        logger.debug("inventory index rebuilt with %d hosts", host_id)
+
+    def query(self, host=None, nodeset=None, cluster=None, role=None,
+              profile=None, network=None, ip=None):
+
+        """Returns the list of hosts matching all given criteria. Each host is
+           a dict with its netifs and profiles."""
+        clauses = []
+        params = []
+        if host is not None:
+            clauses.append("(h.name = ? OR h.fqdn = ?)")
+            params.extend([host, host])
+        if nodeset is not None:
+            from ClusterShell.NodeSet import NodeSet
+            self.db.execute("CREATE TEMP TABLE IF NOT EXISTS nodeset "
+                            "(name TEXT PRIMARY KEY)")
+            self.db.execute("DELETE FROM nodeset")
+            self.db.executemany("INSERT OR IGNORE INTO nodeset VALUES (?)",
+                                [ (node,) for node in NodeSet(nodeset) ])
+            clauses.append("h.name IN (SELECT name FROM nodeset)")
+        for column, value in [ ('cluster', cluster), ('role', role) ]:
+            if value is not None:
+                clauses.append("h.%s = ?" % (column))
+                params.append(value)
+        if profile is not None:
+            clauses.append("h.id IN (SELECT host FROM profiles "
+                           "WHERE profile = ?)")
+            params.append(profile)
+        if network is not None:
+            clauses.append("h.id IN (SELECT host FROM netifs "
+                           "WHERE network = ?)")
+            params.append(network)
+        if ip is not None:
+            clauses.append("h.id IN (SELECT host FROM netifs WHERE ip = ?)")
+            params.append(ip)
+
+        # hosts are joined with their netifs and profiles in one query, the
+        # rows of every host are consecutive and folded in one dict.
+        sql = "SELECT h.*, n.network AS netif_network, n.ip AS netif_ip, " \
+              "p.profile AS profile FROM hosts h " \
+              "LEFT JOIN netifs n ON n.host = h.id " \
+              "LEFT JOIN profiles p ON p.host = h.id"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY h.cluster, h.name, h.id, n.rowid, p.rowid"
+
+        hosts = []
+        host_id = None
+        for row in self.db.execute(sql, params):
+            if row['id'] != host_id:
+                host_id = row['id']
+                host = dict([ (key, row[key]) for key in row.keys()
+                              if key not in HOST_JOINED ])
+                del host['id']
+                host['netifs'] = {}
+                host['profiles'] = []
+                hosts.append(host)
+            if row['netif_network'] is not None:
+                host['netifs'][row['netif_network']] = row['netif_ip']
+            if row['profile'] is not None and \
+               row['profile'] not in host['profiles']:
+                host['profiles'].append(row['profile'])
+        return hosts
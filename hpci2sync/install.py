@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import pwd
+from multiprocessing.pool import ThreadPool
+
+from hpci2sync.generations import Generations
+
+class InstallResult(object):
+    """Result of the installation of the staged files on a target."""
+
+    def __init__(self, target):
+
+        self.target = target
+        self.installed = []
+        self.unchanged = []
+        self.error = None
+
+    @property
+    def ok(self):
+
+        return self.error is None
+
+
+class InstallTarget(object):
+    """icinga2 host configuration directory where the staged files are
+       installed, with the owner of the installed files. When generations
+       retention is set, the files are installed in a new generation of
+       zones.d snapshots."""
+
+    def __init__(self, name, dir_icinga2, owner, generations=0):
+
+        self.name = name
+        self.dir_icinga2 = dir_icinga2
+        self.owner = owner
+        self.generations = None
+        if generations:
+            self.generations = Generations(dir_icinga2, generations)
+
+    def dst_file(self, staged, dir_zones=None):
+
+        if dir_zones is None:
+            dir_zones = os.path.join(self.dir_icinga2, 'zones.d')
+        return os.path.join(dir_zones, staged.path)
+
+    def install(self, staging):
+
+        """Installs the staged files which differ from the files already
+           present on the target. Errors are reported in the result."""
+        result = InstallResult(self)
+        gen = None
+        try:
+            entry = pwd.getpwnam(self.owner)
+            uid = entry[2]
+            gid = entry[3]
+            changed = []
+            for staged in staging:
+                if staged.same(self.dst_file(staged)):
+                    result.unchanged.append(staged.path)
+                else:
+                    changed.append(staged)
+            dir_zones = None
+            if changed and self.generations is not None:
+                gen, dir_zones = self.generations.prepare()
+            for staged in changed:
+                dst_file = self.dst_file(staged, dir_zones)
+                logger.info("installing file %s to %s", staged.path, dst_file)
+                if gen is not None and os.path.exists(dst_file):
+                    # break the hardlink with the previous generations
+                    os.unlink(dst_file)
+                staged.install(dst_file)
+                os.chown(dst_file, uid, gid)
+                os.chmod(dst_file, 0o644)
+                result.installed.append(staged.path)
+            if gen is not None:
+                self.generations.switch(gen)
+                self.generations.prune()
+        except (IOError, OSError, KeyError) as exc:
+            result.error = exc
+            if gen is not None and self.generations.current() != gen:
+                self.generations.discard(gen)
+        return result
+
+
+def install_targets(targets, staging):
+
+    """Installs the staged files on all targets concurrently and returns the
+       list of results, in targets order."""
+    if len(targets) == 1:
+        return [ targets[0].install(staging) ]
+    pool = ThreadPool(len(targets))
+    try:
+        return pool.map(lambda target: target.install(staging), targets)
+    finally:
+        pool.close()
+        pool.join()
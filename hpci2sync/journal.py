@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+
+class CertsJournal(object):
+    """Append-only journal of the completed steps of certificates creation,
+       one '<host> <step>' line per step. It is loaded by the next run to
+       resume every host where it stopped, and removed once a run completed
+       successfully. A recorded step invalidates the later steps previously
+       recorded for the same host, as they must be done again."""
+
+    STEPS = [ 'new-cert', 'sign', 'copy', 'encrypt', 'chmod' ]
+
+    def __init__(self, path):
+
+        self.path = path
+        self.hosts = {}  # host -> list of completed steps
+        self.stream = None
+
+    def _add(self, host, step):
+
+        index = self.STEPS.index(step)
+        steps = [ done for done in self.hosts.get(host, [])
+                  if self.STEPS.index(done) < index ]
+        steps.append(step)
+        self.hosts[host] = steps
+
+    def load(self):
+
+        if not os.path.exists(self.path):
+            return
+        logger.info("resuming certificates creation from journal %s",
+                    self.path)
+        with open(self.path) as stream:
+            for line in stream:
+                fields = line.split()
+                # the last line may be truncated if the run was killed
+                if len(fields) != 2 or fields[1] not in self.STEPS:
+                    logger.debug("ignoring invalid journal line %r", line)
+                    continue
+                self._add(fields[0], fields[1])
+
+    def steps(self, host):
+
+        return self.hosts.get(host, [])
+
+    def resume(self, host, outputs):
+
+        """Returns the index in STEPS of the first step to run for host: the
+           first step which is not recorded or whose output files, given by
+           the outputs dict, are missing."""
+        steps = self.steps(host)
+        for index, step in enumerate(self.STEPS):
+            if step not in steps or \
+               not all([ os.path.exists(output) for output in outputs[step] ]):
+                return index
+        return len(self.STEPS)
+
+    def record(self, host, step):
+
+        """Durably appends the completion of step for host."""
+        if self.stream is None:
+            journal_dir = os.path.dirname(self.path)
+            if not os.path.isdir(journal_dir):
+                os.makedirs(journal_dir)
+            self.stream = open(self.path, 'a')
+        self.stream.write("%s %s\n" % (host, step))
+        self.stream.flush()
+        os.fsync(self.stream.fileno())
+        self._add(host, step)
+
+    def close(self):
+
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def remove(self):
+
+        self.close()
+        if os.path.exists(self.path):
+            logger.debug("removing journal %s", self.path)
+            os.unlink(self.path)
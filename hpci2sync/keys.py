@@ -34,7 +34,10 @@
 import logging
 logger = logging.getLogger(__name__)
 
-import ConfigParser
+try:
+    from configparser import ConfigParser as SafeConfigParser
+except ImportError:  # python 2
+    from ConfigParser import SafeConfigParser
 
 class KeysManager(object):
     """Encoding keys manager."""
@@ -46,6 +49,6 @@ class KeysManager(object):
     def get(self, cluster):
 
         logger.debug("reading encoding key for cluster %s", cluster)
-        parser = ConfigParser.SafeConfigParser()
+        parser = SafeConfigParser()
         parser.read(self.path)
         return parser.get('keys', cluster)
@@ -35,21 +35,27 @@ import logging
 logger = logging.getLogger(__name__)
 
 import os
-import glob
 
 import yaml
 from ClusterShell.NodeSet import NodeSet
 
 from hpci2sync.cluster import ClustersSet, Equipment
 from hpci2sync.hieradata import Hieradata
+from hpci2sync.hostlog import HostsLog
+from hpci2sync.shard import in_shard
+from hpci2sync.source import FilesystemSource
 
 class PrivateData(object):
 
-    def __init__(self, conf, networks):
+    def __init__(self, conf, networks, source=None):
 
         self.conf = conf
+        if source is None:
+            source = FilesystemSource()
+        self.source = source
         self.clusters = ClustersSet()
-        self.hieradata = Hieradata(conf, self.clusters, networks)
+        self.hieradata = Hieradata(conf, self.clusters, networks, source)
+        self.hostslog = HostsLog(logger)
 
     def parse(self):
         # first parse equipments specs then master_network and profiles in
@@ -58,15 +64,39 @@ class PrivateData(object):
         self.hieradata.parse()
         return self.clusters
 
-    def parse_equipments(self):
+    def iter_clusters(self):
+
+        """Parses the clusters one by one, in name order, yielding every
+           cluster once its equipments and hieradata are parsed. The cluster
+           is removed from the clusters set when the generator is resumed,
+           so only one cluster is kept in memory at a time."""
+        for name in sorted(self.clusters_names()):
+            self.parse_cluster(name)
+            if self.source.isdir(os.path.join(self.conf.dir_hieradata, name)):
+                self.hieradata.parse_cluster(name)
+            yield self.clusters.get(name)
+            self.clusters.discard(name)
+
+    def clusters_names(self):
 
-        clusters = os.listdir(self.conf.dir_equipments)
+        """Returns the names of the clusters which are not excluded."""
+        clusters = self.source.listdir(self.conf.dir_equipments)
         logger.debug("discovered clusters: %s", str(clusters))
+        names = []
         for cluster in clusters:
             if cluster in self.conf.exclude_clusters:
                 logger.debug("skipping cluster %s because excluded",
                              cluster)
                 continue  # jump to next cluster iteration
+            if not in_shard(cluster, self.conf.shard):
+                logger.debug("skipping cluster %s of another shard", cluster)
+                continue
+            names.append(cluster)
+        return names
+
+    def parse_equipments(self):
+
+        for cluster in self.clusters_names():
             self.parse_cluster(cluster)
 
     def parse_cluster(self, name):
@@ -79,13 +109,15 @@ class PrivateData(object):
         prefix = self.hieradata.parse_cluster_prefix(name)
         cluster = self.clusters.add(name, prefix)
 
-        glob_eqt_files = os.path.join(self.conf.dir_equipments, name, '*.yaml')
-        equipment_files = glob.glob(glob_eqt_files)
+        equipment_files = self.source.glob(
+                            os.path.join(self.conf.dir_equipments, name),
+                            '*.yaml')
         for equipment_file in equipment_files:
             if os.path.basename(equipment_file) == 'misc.yaml':
                 self.parse_misc_file(cluster, equipment_file)
             else: 
                 self.parse_equipment_file(cluster, equipment_file)
+        self.hostslog.flush()
 
     def parse_equipment_file(self, cluster, equipment_file):
 
@@ -93,10 +125,10 @@ class PrivateData(object):
         logger.debug("parsing equipment_file %s (category: %s)",
                      equipment_file, category)
 
-        with open(equipment_file, 'r') as stream:
+        with self.source.open(equipment_file) as stream:
             try:
-                data = yaml.load(stream)
-                for hostlist, params in data.iteritems():
+                data = yaml.safe_load(stream)
+                for hostlist, params in sorted(data.items()):
                     self.parse_equipment_set(cluster, category,
                                              hostlist, params)
 
@@ -108,10 +140,10 @@ class PrivateData(object):
 
         logger.debug("parsing misc equipment file %s", file_path)
 
-        with open(file_path, 'r') as stream:
+        with self.source.open(file_path) as stream:
             try:
-                data = yaml.load(stream)
-                for hostlist, params in data.iteritems():
+                data = yaml.safe_load(stream)
+                for hostlist, params in sorted(data.items()):
                     category = params['category']
                     self.parse_equipment_set(cluster, category,
                                              hostlist, params)
@@ -131,8 +163,10 @@ class PrivateData(object):
                 try:
                     equipment.extract_role(cluster.prefix)
                 except RuntimeError:
-                    logger.error("unable to extract role from equipement "
-                                 "name %s", equipment.name)
+                    self.hostslog.error("unable to extract role from "
+                                        "equipement name %s", equipment.name)
                     continue  # skip server, continue with next equipment
+                self.hostslog.debug("role of %s is %s", equipment.name,
+                                    equipment.role)
             equipment.model = params.get('model')
-            cluster.equipments.add(equipment)
+            cluster.add_equipment(equipment)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+import logging
+logger = logging.getLogger(__name__)
+
+from hpci2sync.hostlog import HostsLog
+
+class SatelliteZone(object):
+    """Equipments monitored by the satellite zone of a cluster."""
+
+    def __init__(self, name):
+
+        self.name = name
+        self.hosts = []
+        self.endpoints = []
+        self.nodes = []
+
+
+class ZonesRouting(object):
+    """Classifies in one pass all equipments of a clusters set in zone
+       buckets: master hosts and endpoints, satellite zones hosts, endpoints
+       and compute nodes. The IP address and the attributes of every
+       equipment are set once during classification."""
+
+    def __init__(self, profs_master, prof_monsat, nodes_roles):
+
+        self.profs_master = frozenset(profs_master)
+        self.prof_monsat = prof_monsat
+        self.nodes_roles = frozenset(nodes_roles)
+
+        self.master_hosts = []
+        self.master_endpoints = []
+        self.satellites = {}  # cluster name -> SatelliteZone
+
+    def classify(self, clusters):
+
+        for cluster in clusters:
+            self.classify_cluster(cluster)
+
+    def classify_cluster(self, cluster):
+
+        satellite = SatelliteZone(cluster.name)
+        self.satellites[cluster.name] = satellite
+        hostslog = HostsLog(logger)
+
+        for equipment in cluster:
+
+            # nothing is allocated per equipment, the garbage collector
+            # would be triggered over and over on large sites
+            profiles = equipment.profiles
+            if equipment.wan_connected_only or \
+               (profiles is not None and
+                not self.profs_master.isdisjoint(profiles)):
+                hostslog.debug("equipment %s must be monitored by master",
+                               equipment.name)
+                equipment.ip = equipment.get_ip_netif('wan')
+                equipment.set_attrs()
+                self.master_hosts.append(equipment)
+                if equipment.category == 'server' and \
+                   (profiles is None or self.prof_monsat not in profiles):
+                    self.master_endpoints.append(equipment)
+                continue
+
+            hostslog.debug("equipment %s is monitored by satellite",
+                           equipment.name)
+            equipment.ip = equipment.get_ip_netif('administration')
+            if equipment.ip is None:
+                equipment.ip = equipment.get_ip_netif('management')
+            equipment.set_attrs()
+            if equipment.role in self.nodes_roles:
+                satellite.nodes.append(equipment)
+            else:
+                satellite.hosts.append(equipment)
+                if equipment.category == 'server':
+                    satellite.endpoints.append(equipment)
+        hostslog.flush()
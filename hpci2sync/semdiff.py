@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+"""Object-level semantic diff of icinga2 Host, Endpoint and Zone objects.
+
+   Objects are represented by dicts with their type, name, imported
+   templates, attributes and vars. They are either built out of equipments
+   or parsed from the configuration files generated by hpci2sync, resolving
+   the templates defined in the same file and the compact nodes loops."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import re
+import json
+import hashlib
+
+from hpci2sync.emitter import text
+
+#
+# objects built out of equipments
+#
+
+def new_object(objtype, name, imports=None, attrs=None, objvars=None):
+
+    return { 'type': objtype,
+             'name': name,
+             'imports': imports or [],
+             'attrs': attrs or {},
+             'vars': objvars or {} }
+
+
+def host_object(host, kind):
+
+    """Returns the Host object of host, kind being either equipment or
+       node."""
+    imports = { 'equipment': 'hpc-equipment',
+                'node': 'hpc-compute-node' }
+    fqdn = text(host.fqdn)
+    objvars = dict(host.attrs)
+    if kind == 'equipment' and host.category == 'server':
+        objvars['client_endpoint'] = fqdn
+    return new_object('Host', fqdn, [ imports[kind] ],
+                      { 'display_name': text(host.name),
+                        'address': text(host.ip) },
+                      objvars)
+
+
+def zones_objects(host, parent):
+
+    """Returns the Endpoint and Zone objects of host with parent zone."""
+    fqdn = text(host.fqdn)
+    return [ new_object('Endpoint', fqdn, attrs={ 'host': text(host.ip) }),
+             new_object('Zone', fqdn, attrs={ 'parent': text(parent),
+                                              'endpoints': [ fqdn ] }) ]
+
+#
+# objects parsed out of generated files
+#
+
+class ParseError(Exception):
+    pass
+
+
+TOKENS = re.compile(r'''
+    (?P<space>\s+|//[^\n]*|\#[^\n]*)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<number>-?\d+(?:\.\d+)?(?![\w.]))
+  | (?P<ident>[A-Za-z_][\w.:-]*)
+  | (?P<punct>\+=|=>|[{}\[\](),=])
+''', re.VERBOSE)
+
+UNESCAPES = { 'n': '\n', 'r': '\r', 't': '\t', 'b': '\b', 'f': '\f' }
+
+
+def tokenize(data):
+
+    tokens = []
+    pos = 0
+    while pos < len(data):
+        match = TOKENS.match(data, pos)
+        if match is None:
+            raise ParseError("unexpected character %r at offset %d"
+                             % (data[pos], pos))
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == 'space':
+            continue
+        value = match.group(kind)
+        if kind == 'string':
+            value = re.sub(r'\\(.)',
+                           lambda esc: UNESCAPES.get(esc.group(1),
+                                                     esc.group(1)),
+                           value[1:-1])
+        elif kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        tokens.append((kind, value))
+    return tokens
+
+
+class ObjectsParser(object):
+    """Parser of the subset of icinga2 DSL emitted by hpci2sync templates and
+       native emitter."""
+
+    def __init__(self, data):
+
+        self.tokens = tokenize(data)
+        self.pos = 0
+        self.variables = {}
+        self.templates = {}
+        self.objects = []
+
+    def parse(self):
+
+        """Returns the list of objects defined in data."""
+        while not self._end():
+            self._statement()
+        return self.objects
+
+    def _end(self):
+
+        return self.pos >= len(self.tokens)
+
+    def _peek(self):
+
+        if self._end():
+            return (None, None)
+        return self.tokens[self.pos]
+
+    def _next(self, kind=None, value=None):
+
+        if self._end():
+            raise ParseError("unexpected end of file")
+        token = self.tokens[self.pos]
+        if (kind is not None and token[0] != kind) or \
+           (value is not None and token[1] != value):
+            raise ParseError("expected %s, found %s"
+                             % (value or kind, token[1]))
+        self.pos += 1
+        return token[1]
+
+    def _statement(self, scope=None):
+
+        keyword = self._next('ident')
+        if keyword in ('object', 'template'):
+            objtype = self._next('ident')
+            kind, name = self._peek()
+            self.pos += 1
+            if kind == 'ident':  # name given by a loop variable
+                name = self._resolve(name, scope, None)
+            use = {}
+            if self._peek() == ('ident', 'use'):
+                self.pos += 1
+                self._next('punct', '(')
+                while self._peek() != ('punct', ')'):
+                    used = self._next('ident')
+                    use[used] = self._resolve(used, scope, None)
+                    if self._peek() == ('punct', ','):
+                        self.pos += 1
+                self._next('punct', ')')
+            obj = new_object(objtype, name)
+            self._body(obj, use)
+            if keyword == 'template':
+                self.templates[name] = obj
+            else:
+                self.objects.append(obj)
+        elif keyword == 'var':
+            name = self._next('ident')
+            self._next('punct', '=')
+            self.variables[name] = self._expression(scope, None)
+        elif keyword == 'for':
+            self._next('punct', '(')
+            key_var = self._next('ident')
+            self._next('punct', '=>')
+            value_var = self._next('ident')
+            self._next('ident', 'in')
+            collection = self._resolve(self._next('ident'), scope, None)
+            self._next('punct', ')')
+            self._next('punct', '{')
+            start = self.pos
+            for key in sorted(collection):
+                self.pos = start
+                loop_scope = { key_var: key, value_var: collection[key] }
+                while self._peek() != ('punct', '}'):
+                    self._statement(loop_scope)
+            if not collection:
+                self._skip_block()
+            self._next('punct', '}')
+        else:
+            raise ParseError("unsupported statement %s" % (keyword))
+
+    def _skip_block(self):
+
+        depth = 0
+        while True:
+            kind, value = self._peek()
+            if (kind, value) == ('punct', '}') and depth == 0:
+                return
+            if (kind, value) == ('punct', '{'):
+                depth += 1
+            elif (kind, value) == ('punct', '}'):
+                depth -= 1
+            self.pos += 1
+
+    def _body(self, obj, scope):
+
+        self._next('punct', '{')
+        while self._peek() != ('punct', '}'):
+            name = self._next('ident')
+            if name == 'import':
+                template = self._next('string')
+                if template in self.templates:
+                    self._inherit(obj, self.templates[template])
+                else:
+                    obj['imports'].append(template)
+                continue
+            operator = self._next('punct')
+            value = self._expression(scope, obj)
+            if name == 'vars' and operator == '+=':
+                obj['vars'].update(value)
+            elif name.startswith('vars.'):
+                obj['vars'][name[len('vars.'):]] = value
+            else:
+                obj['attrs'][name] = value
+        self._next('punct', '}')
+
+    @staticmethod
+    def _inherit(obj, template):
+
+        obj['imports'].extend(template['imports'])
+        obj['attrs'].update(template['attrs'])
+        obj['vars'].update(template['vars'])
+
+    def _resolve(self, name, scope, obj):
+
+        if name == 'name' and obj is not None:
+            return obj['name']
+        parts = name.split('.')
+        if scope is not None and parts[0] in scope:
+            value = scope[parts[0]]
+        elif parts[0] in self.variables:
+            value = self.variables[parts[0]]
+        else:
+            raise ParseError("unknown variable %s" % (name))
+        for part in parts[1:]:
+            value = value[part]
+        return value
+
+    def _expression(self, scope, obj):
+
+        if self._end():
+            raise ParseError("unexpected end of file")
+        kind, value = self.tokens[self.pos]
+        self.pos += 1
+        if kind in ('string', 'number'):
+            return value
+        if kind == 'ident':
+            constants = { 'true': True, 'false': False, 'null': None,
+                          # Python literals rendered by jinja2 templates
+                          'True': True, 'False': False, 'None': None }
+            if value in constants:
+                return constants[value]
+            return self._resolve(value, scope, obj)
+        if value == '[':
+            items = []
+            while self._peek() != ('punct', ']'):
+                items.append(self._expression(scope, obj))
+                if self._peek() == ('punct', ','):
+                    self.pos += 1
+            self.pos += 1
+            return items
+        if value == '{':
+            items = {}
+            while self._peek() != ('punct', '}'):
+                key = self._next()
+                self._next('punct', '=')
+                items[key] = self._expression(scope, obj)
+                if self._peek() == ('punct', ','):
+                    self.pos += 1
+            self.pos += 1
+            return items
+        raise ParseError("unexpected %s" % (value))
+
+
+def parse_objects(data):
+
+    return ObjectsParser(data).parse()
+
+#
+# diff
+#
+
+class ObjectsDiff(object):
+    """Differences between two sets of objects, compared by type and name."""
+
+    def __init__(self):
+
+        self.added = []  # list of (type, name)
+        self.removed = []
+        self.changed = []  # list of (type, name, {field: (old, new)})
+
+    def __len__(self):
+
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def compare(self, old_objects, new_objects):
+
+        old = dict([ ((obj['type'], obj['name']), obj)
+                     for obj in old_objects ])
+        new = dict([ ((obj['type'], obj['name']), obj)
+                     for obj in new_objects ])
+        for key in sorted(new, key=str):
+            if key not in old:
+                self.added.append(key)
+                continue
+            changes = self._changes(old[key], new[key])
+            if changes:
+                self.changed.append(key + (changes,))
+        self.removed.extend(sorted([ key for key in old if key not in new ],
+                                   key=str))
+
+    @staticmethod
+    def _changes(old, new):
+
+        changes = {}
+        if old['imports'] != new['imports']:
+            changes['imports'] = (old['imports'], new['imports'])
+        for field in ('attrs', 'vars'):
+            prefix = 'vars.' if field == 'vars' else ''
+            for key in set(old[field]) | set(new[field]):
+                old_value = old[field].get(key)
+                new_value = new[field].get(key)
+                if old_value != new_value:
+                    changes[prefix + key] = (old_value, new_value)
+        return changes
+
+    def lines(self, path):
+
+        """Returns the text lines of the diff of file path."""
+        lines = []
+        for objtype, name in self.added:
+            lines.append("%s: + %s %s\n" % (path, objtype, name))
+        for objtype, name in self.removed:
+            lines.append("%s: - %s %s\n" % (path, objtype, name))
+        for objtype, name, changes in self.changed:
+            for field in sorted(changes):
+                old, new = changes[field]
+                lines.append("%s: ~ %s %s %s: %s -> %s\n"
+                             % (path, objtype, name, field,
+                                json.dumps(old, sort_keys=True),
+                                json.dumps(new, sort_keys=True)))
+        return lines
+
+    def dump(self):
+
+        """Returns the diff as a JSON serializable dict."""
+        return { 'added': [ list(key) for key in self.added ],
+                 'removed': [ list(key) for key in self.removed ],
+                 'changed': [ { 'type': objtype,
+                                'name': name,
+                                'changes': dict([ (field, list(values))
+                                                  for field, values
+                                                  in changes.items() ]) }
+                              for objtype, name, changes in self.changed ] }
+
+
+class InstalledObjects(object):
+    """Objects of the files installed in a target, saved in a JSON file
+       along with the digests of the files. The saved objects of an installed
+       file are used as long as its digest matches, the file is parsed
+       otherwise."""
+
+    def __init__(self, path, dir_icinga2):
+
+        self.path = path
+        self.dir_icinga2 = dir_icinga2
+        self.files = {}  # path in zones.d -> { digest, objects }
+
+    @staticmethod
+    def digest(content):
+
+        """Returns the digest of content, either bytes or text encoded in
+           UTF-8."""
+        if not isinstance(content, bytes):
+            content = content.encode('utf-8')
+        return hashlib.sha1(content).hexdigest()
+
+    def load(self):
+
+        try:
+            with open(self.path) as stream:
+                saved = json.load(stream)
+        except (IOError, ValueError) as err:
+            logger.debug("unable to load installed objects %s: %s",
+                         self.path, err)
+            return
+        if saved.get('target') != self.dir_icinga2:
+            logger.debug("installed objects saved for another target %s",
+                         saved.get('target'))
+            return
+        self.files = saved['files']
+
+    def objects(self, path, dst_file):
+
+        """Returns the objects of installed file dst_file, or an empty list if
+           it does not exist. Raises ParseError if the file is parsed and
+           contains unsupported statements."""
+        if not os.path.exists(dst_file):
+            return []
+        with open(dst_file, 'rb') as stream:
+            content = stream.read()
+        saved = self.files.get(path)
+        if saved is not None and saved['digest'] == self.digest(content):
+            return saved['objects']
+        logger.debug("parsing objects of installed file %s", dst_file)
+        try:
+            content = content.decode('utf-8')
+        except UnicodeDecodeError as err:
+            raise ParseError("invalid UTF-8 content: %s" % (err))
+        return parse_objects(content)
+
+    def update(self, path, content, objects):
+
+        self.files[path] = { 'digest': self.digest(content),
+                             'objects': objects }
+
+    def save(self):
+
+        dir_cache = os.path.dirname(self.path)
+        if not os.path.isdir(dir_cache):
+            os.makedirs(dir_cache)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as stream:
+            json.dump({ 'target': self.dir_icinga2,
+                        'files': self.files }, stream)
+        os.rename(tmp_path, self.path)
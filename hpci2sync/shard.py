@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+"""Horizontal sharding of conf action. Clusters are deterministically
+   partitioned in shards, every shard renders the zones of its clusters in a
+   common directory along with the equipments it contributes to the master
+   zone. The merge step then renders the master zone out of all shards
+   contributions and installs everything. The shards directory may be shared
+   between hosts, everything is saved in JSON."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import json
+import shutil
+import zlib
+
+try:
+    string_types = basestring
+except NameError:  # python 3
+    string_types = str
+
+def parse_shard(value):
+
+    """Returns the (index, count) tuple of a shard given as I/N, with
+       1 <= I <= N. Raises ValueError if invalid."""
+    try:
+        index, count = [ int(part) for part in value.split('/') ]
+    except ValueError:
+        raise ValueError("invalid shard %s, I/N expected" % (value))
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError("invalid shard %s, 1 <= I <= N expected" % (value))
+    return index, count
+
+
+def parse_shards_count(value):
+
+    """Returns the number of shards N given as a string, with N >= 1.
+       Raises ValueError if invalid."""
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValueError("invalid shards count %s, integer expected"
+                         % (value))
+    if count < 1:
+        raise ValueError("invalid shards count %s, N >= 1 expected"
+                         % (value))
+    return count
+
+
+def in_shard(cluster, shard):
+
+    """Returns True if the cluster belongs to shard, or if shard is None."""
+    if shard is None:
+        return True
+    index, count = shard
+    # crc32 is signed with python 2, it is masked to get the same shards
+    # with all python versions
+    digest = zlib.crc32(cluster.encode('utf-8')) & 0xffffffff
+    return digest % count == index - 1
+
+
+def native(value):
+
+    """Returns value loaded from JSON with ASCII strings converted back to
+       native strings on python 2, as the YAML parser returns them, so that
+       merged zones are rendered as in a single run."""
+    if isinstance(value, dict):
+        return dict([ (native(key), native(item))
+                      for key, item in value.items() ])
+    if isinstance(value, list):
+        return [ native(item) for item in value ]
+    if isinstance(value, string_types) and not isinstance(value, str):
+        try:
+            return value.encode('ascii')
+        except UnicodeError:
+            return value
+    return value
+
+
+class MasterHost(object):
+    """Equipment contributed by a shard to the master zone, restricted to
+       the data rendered in master zone files."""
+
+    FIELDS = [ 'fqdn', 'name', 'ip', 'attrs', 'category' ]
+
+    def __init__(self, data):
+
+        for field in self.FIELDS:
+            setattr(self, field, data[field])
+
+    @classmethod
+    def dump(cls, equipment):
+
+        return dict([ (field, getattr(equipment, field))
+                      for field in cls.FIELDS ])
+
+
+class ShardStore(object):
+    """Outputs of a shard in the common shards directory: the staged zones
+       files with their objects, the equipments contributed to the master
+       zone by every cluster and the completion marker."""
+
+    def __init__(self, dir_shards, index):
+
+        self.index = index
+        self.path = os.path.join(dir_shards, str(index))
+        self.dir_zones = os.path.join(self.path, 'zones')
+        self.dir_master = os.path.join(self.path, 'master')
+        self.file_objects = os.path.join(self.path, 'objects.json')
+        self.file_done = os.path.join(self.path, 'done')
+
+    def reset(self):
+
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        os.makedirs(self.dir_zones)
+        os.makedirs(self.dir_master)
+
+    def save_zones(self, staging):
+
+        objects = {}
+        for staged in staging:
+            dst_file = os.path.join(self.dir_zones, staged.path)
+            dst_dir = os.path.dirname(dst_file)
+            if not os.path.isdir(dst_dir):
+                os.makedirs(dst_dir)
+            staged.install(dst_file)
+            if staged.objects is not None:
+                objects[staged.path] = staged.objects
+        with open(self.file_objects, 'w') as stream:
+            json.dump(objects, stream)
+
+    def save_master(self, cluster, hosts, endpoints):
+
+        """Saves the equipments of cluster monitored by master, the endpoints
+           being a subset of the hosts."""
+        data = { 'hosts': [ MasterHost.dump(host) for host in hosts ],
+                 'endpoints': [ host.name for host in endpoints ] }
+        with open(os.path.join(self.dir_master, cluster + '.json'),
+                  'w') as stream:
+            json.dump(data, stream)
+
+    def complete(self, count, clusters):
+
+        with open(self.file_done, 'w') as stream:
+            json.dump({ 'count': count, 'clusters': clusters }, stream)
+
+    def check(self, count):
+
+        """Returns the list of clusters of the shard. Raises ValueError if
+           the shard is not complete for count shards."""
+        try:
+            with open(self.file_done) as stream:
+                done = json.load(stream)
+        except (IOError, ValueError):
+            raise ValueError("shard %d/%d is not complete in %s"
+                             % (self.index, count, self.path))
+        if done['count'] != count:
+            raise ValueError("shard %d was run with %d shards instead of %d"
+                             % (self.index, done['count'], count))
+        return done['clusters']
+
+    def master(self):
+
+        """Returns the list of (cluster, hosts, endpoints) contributions to
+           master zone, hosts being MasterHost objects."""
+        contributions = []
+        for filename in sorted(os.listdir(self.dir_master)):
+            with open(os.path.join(self.dir_master, filename)) as stream:
+                data = native(json.load(stream))
+            hosts = [ MasterHost(host) for host in data['hosts'] ]
+            index = dict([ (host.name, host) for host in hosts ])
+            endpoints = [ index[name] for name in data['endpoints'] ]
+            contributions.append((filename[:-len('.json')], hosts,
+                                  endpoints))
+        return contributions
+
+    def zones(self):
+
+        """Returns the list of (path, file, objects) of staged zones files,
+           objects being None for static files."""
+        with open(self.file_objects) as stream:
+            objects = json.load(stream)
+        files = []
+        for dirpath, dirnames, filenames in os.walk(self.dir_zones):
+            for filename in filenames:
+                src = os.path.join(dirpath, filename)
+                path = os.path.relpath(src, self.dir_zones)
+                files.append((path, src, objects.get(path)))
+        return sorted(files, key=lambda item: item[0])
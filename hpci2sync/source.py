@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+"""Input sources of privatedata files. Parsers access input files through a
+   source object, either the filesystem or the objects of a given commit of
+   privatedata git repository."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import io
+import stat
+import errno
+import fnmatch
+import subprocess
+try:
+    from os import scandir
+except ImportError:  # python 2
+    scandir = None
+
+
+class TreeIndex(object):
+    """Index of all the directories and files under a set of top
+       directories, crawled in one pass with their stat data. Symlinks are
+       followed for stat data but symlinked directories are not crawled, as
+       os.walk does."""
+
+    def __init__(self, tops):
+
+        self.dirs = {}  # dir path -> { name: (is dir, mtime, size) or None }
+        for top in tops:
+            self._crawl(os.path.normpath(top))
+        logger.debug("indexed %d directories with %d entries",
+                     len(self.dirs),
+                     sum([ len(entries) for entries in self.dirs.values() ]))
+
+    def _crawl(self, top):
+
+        stack = [ top ]
+        while stack:
+            path = stack.pop()
+            if path in self.dirs:
+                continue
+            try:
+                entries, subdirs = self._scan(path)
+            except OSError:
+                continue  # missing top or unreadable directory
+            self.dirs[path] = entries
+            stack.extend([ os.path.join(path, name) for name in subdirs ])
+
+    @staticmethod
+    def _scan(path):
+
+        """Returns the entries of directory path, with None for broken
+           symlinks, and the list of its subdirectories to crawl."""
+        entries = {}
+        subdirs = []
+        if scandir is not None:
+            scanned = [ (entry.name, entry.is_symlink(), entry.stat)
+                        for entry in scandir(path) ]
+        else:
+            scanned = []
+            for name in os.listdir(path):
+                entry_path = os.path.join(path, name)
+                lstat = os.lstat(entry_path)
+                if stat.S_ISLNK(lstat.st_mode):
+                    scanned.append((name, True,
+                                    lambda path=entry_path: os.stat(path)))
+                else:
+                    scanned.append((name, False, lambda lstat=lstat: lstat))
+        for name, islink, entry_stat in scanned:
+            try:
+                entry_stat = entry_stat()
+            except OSError:
+                entries[name] = None
+                continue
+            isdir = stat.S_ISDIR(entry_stat.st_mode)
+            entries[name] = (isdir, int(entry_stat.st_mtime),
+                             entry_stat.st_size)
+            if isdir and not islink:
+                subdirs.append(name)
+        return entries, subdirs
+
+    def entries(self, path):
+
+        """Returns the entries of directory path, or None if not indexed."""
+        return self.dirs.get(os.path.normpath(path))
+
+    def lookup(self, path):
+
+        """Returns a (indexed, entry) tuple for path. When its parent
+           directory is indexed, entry is None if path does not exist."""
+        parent, name = os.path.split(os.path.normpath(path))
+        entries = self.dirs.get(parent)
+        if entries is None:
+            return False, None
+        return True, entries.get(name)
+
+
+class FilesystemSource(object):
+    """Input files read from the filesystem. When top directories are
+       given, they are crawled once on first access and the directories
+       listings and files existence are answered out of the tree index,
+       without further round trip to the filesystem."""
+
+    ondisk = True
+
+    def __init__(self, tops=None):
+
+        self.tops = tops or []
+        self._index = None
+
+    @property
+    def index(self):
+
+        if self._index is None:
+            self._index = TreeIndex(self.tops)
+        return self._index
+
+    def listdir(self, path):
+
+        """Returns the sorted names of the entries of directory path, as
+           git trees are."""
+        entries = self.index.entries(path)
+        if entries is None:
+            return sorted(os.listdir(path))
+        return sorted(entries.keys())
+
+    def isdir(self, path):
+
+        if self.index.entries(path) is not None:
+            return True
+        indexed, entry = self.index.lookup(path)
+        if not indexed:
+            return os.path.isdir(path)
+        return entry is not None and entry[0]
+
+    def exists(self, path):
+
+        indexed, entry = self.index.lookup(path)
+        if not indexed:
+            return os.path.exists(path)
+        return entry is not None
+
+    def stats(self, top):
+
+        """Returns the list of (path, mtime, size) tuples of file top or of
+           all the files under directory top, in os.walk order with sorted
+           names. Missing files are skipped."""
+        entries = self.index.entries(top)
+        if entries is None:
+            indexed, entry = self.index.lookup(top)
+            if not indexed:
+                return self._walk_stats(top)
+            if entry is None or entry[0]:
+                return []
+            return [ (top, entry[1], entry[2]) ]
+        stats = []
+        subdirs = []
+        for name in sorted(entries.keys()):
+            entry = entries[name]
+            if entry is not None and entry[0]:
+                subdirs.append(name)
+            elif entry is not None:
+                stats.append((os.path.join(top, name), entry[1], entry[2]))
+        for name in subdirs:
+            stats.extend(self.stats(os.path.join(top, name)))
+        return stats
+
+    @staticmethod
+    def _walk_stats(top):
+
+        if not os.path.isdir(top):
+            paths = [ top ]
+        else:
+            paths = []
+            for root, directories, filenames in os.walk(top):
+                directories.sort()
+                paths.extend([ os.path.join(root, filename)
+                               for filename in sorted(filenames) ])
+        stats = []
+        for path in paths:
+            try:
+                path_stat = os.stat(path)
+            except OSError:
+                continue
+            stats.append((path, int(path_stat.st_mtime), path_stat.st_size))
+        return stats
+
+    def glob(self, path, pattern):
+
+        """Returns the paths of the files in directory path matching
+           pattern, excluding hidden files as glob does."""
+        if not self.isdir(path):
+            return []
+        return [ os.path.join(path, filename)
+                 for filename in sorted(self.listdir(path))
+                 if not filename.startswith('.')
+                 and fnmatch.fnmatch(filename, pattern) ]
+
+    def open(self, path):
+
+        return open(path, 'r')
+
+    def read(self, path):
+
+        with self.open(path) as stream:
+            return stream.read()
+
+    def close(self):
+
+        pass
+
+
+class GitSource(FilesystemSource):
+    """Input files read from the objects of a commit of a git repository,
+       through one long-lived git cat-file --batch process."""
+
+    ondisk = False
+
+    def __init__(self, repository, revision):
+
+        self.repository = repository
+        self.commit = self.rev_parse(revision)
+        self._process = None
+        self._trees = {}  # relative path -> list of (name, is dir) tuples
+        logger.debug("reading privatedata from commit %s of repository %s",
+                     self.commit, self.repository)
+
+    def _git(self, *args):
+
+        cmd = [ 'git', '-C', self.repository ] + list(args)
+        return subprocess.check_output(cmd).decode('utf-8')
+
+    def rev_parse(self, revision):
+
+        return self._git('rev-parse', '--verify',
+                         revision + '^{commit}').strip()
+
+    def changed_paths(self, since):
+
+        """Returns the list of paths, relative to the repository, changed
+           between commit since and source commit."""
+        output = self._git('diff', '--name-only', since, self.commit)
+        return [ path for path in output.splitlines() if path ]
+
+    def relpath(self, path):
+
+        relpath = os.path.relpath(path, self.repository)
+        if relpath == os.curdir:
+            return ''
+        if relpath.startswith(os.pardir):
+            raise ValueError("path %s is not in repository %s"
+                             % (path, self.repository))
+        return relpath
+
+    def _object(self, relpath):
+
+        """Returns the (type, content) tuple of the object at relpath in
+           source commit, or (None, None) if missing."""
+        if self._process is None:
+            self._process = subprocess.Popen(
+                              [ 'git', '-C', self.repository,
+                                'cat-file', '--batch' ],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        request = "%s:%s\n" % (self.commit, relpath)
+        self._process.stdin.write(request.encode('utf-8'))
+        self._process.stdin.flush()
+        header = self._process.stdout.readline().decode('utf-8').split()
+        if len(header) != 3:  # <object> missing
+            return None, None
+        size = int(header[2])
+        content = self._process.stdout.read(size + 1)[:size]
+        return header[1], content
+
+    def _tree(self, path):
+
+        """Returns the entries of tree at path, or None if path is not a
+           tree."""
+        relpath = self.relpath(path)
+        if relpath not in self._trees:
+            objtype, content = self._object(relpath)
+            if objtype != 'tree':
+                self._trees[relpath] = None
+            else:
+                self._trees[relpath] = self._parse_tree(content)
+        return self._trees[relpath]
+
+    @staticmethod
+    def _parse_tree(content):
+
+        # entries are: <mode> SP <name> NUL <20 bytes binary sha1>
+        entries = []
+        pos = 0
+        while pos < len(content):
+            space = content.index(b' ', pos)
+            nul = content.index(b'\0', space)
+            mode = content[pos:space]
+            name = content[space + 1:nul].decode('utf-8')
+            entries.append((name, mode == b'40000'))
+            pos = nul + 21
+        return entries
+
+    def listdir(self, path):
+
+        entries = self._tree(path)
+        if entries is None:
+            raise OSError(errno.ENOENT, "no such directory in commit %s"
+                                        % (self.commit), path)
+        return [ name for name, isdir in entries ]
+
+    def isdir(self, path):
+
+        return self._tree(path) is not None
+
+    def exists(self, path):
+
+        parent, name = os.path.split(path)
+        entries = self._tree(parent)
+        if entries is None:
+            return False
+        return name in [ entry[0] for entry in entries ]
+
+    def open(self, path):
+
+        objtype, content = self._object(self.relpath(path))
+        if objtype != 'blob':
+            raise IOError(errno.ENOENT, "no such file in commit %s"
+                                        % (self.commit), path)
+        return io.BytesIO(content)
+
+    def read(self, path):
+
+        with self.open(path) as stream:
+            return stream.read().decode('utf-8')
+
+    def close(self):
+
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process = None
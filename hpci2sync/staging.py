@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import shutil
+import filecmp
+
+from hpci2sync.tmp import TmpDirManager
+
+class StagedFile(object):
+    """A file staged for installation in icinga2 zones.d directory. Its
+       content is either kept in memory or available in an on-disk file
+       (spilled generated content or static file from privatedata). The
+       icinga2 objects defined in generated files are optionally attached
+       for semantic diff."""
+
+    def __init__(self, path, content=None, src=None, objects=None):
+
+        self.path = path  # relative path in zones.d
+        self.content = content
+        self.src = src
+        self.objects = objects
+
+    def read(self):
+
+        if self.content is not None:
+            return self.content
+        with open(self.src) as stream:
+            return stream.read()
+
+    def readlines(self):
+
+        if self.content is not None:
+            return self.content.splitlines(True)
+        with open(self.src) as stream:
+            return stream.readlines()
+
+    def same(self, dst_file):
+
+        """Returns True if dst_file exists with the staged content."""
+        if not os.path.exists(dst_file):
+            return False
+        if self.content is None:
+            return filecmp.cmp(self.src, dst_file, shallow=False)
+        with open(dst_file) as stream:
+            return stream.read() == self.content
+
+    def install(self, dst_file):
+
+        """Write the staged file content into dst_file."""
+        if self.content is not None:
+            with open(dst_file, 'w') as stream:
+                stream.write(self.content)
+        else:
+            shutil.copyfile(self.src, dst_file)
+
+
+class StagingArea(object):
+    """Staging area of the generated configuration files. In memory mode,
+       generated content is kept in memory until the spill threshold (in
+       bytes) is reached, then it is written in a tmp dir. In disk mode,
+       everything is written in the tmp dir which is kept for inspection."""
+
+    def __init__(self, mode, parent, spill):
+
+        if mode not in ['memory', 'disk']:
+            raise ValueError("invalid staging mode %s" % (mode))
+        self.mode = mode
+        self.spill = spill
+        self.tmpdir = TmpDirManager(parent)
+        self.files = {}
+        self.memsize = 0
+
+    def __iter__(self):
+
+        for path in sorted(self.files.keys()):
+            yield self.files[path]
+
+    def __len__(self):
+
+        return len(self.files)
+
+    def _disk_path(self, path):
+
+        if self.tmpdir.path is None:
+            self.tmpdir.make()
+            logger.debug("staging tmp dir %s created", self.tmpdir.path)
+        disk_path = os.path.join(self.tmpdir.path, path)
+        disk_dir = os.path.dirname(disk_path)
+        if not os.path.isdir(disk_dir):
+            os.makedirs(disk_dir)
+        return disk_path
+
+    def add(self, path, content, objects=None):
+
+        """Stage generated content for file path, defining objects."""
+        if self.mode == 'disk' or self.memsize + len(content) > self.spill:
+            disk_path = self._disk_path(path)
+            logger.debug("staging %s on disk in %s", path, disk_path)
+            with open(disk_path, 'w') as stream:
+                stream.write(content)
+            self.files[path] = StagedFile(path, src=disk_path,
+                                          objects=objects)
+        else:
+            self.memsize += len(content)
+            self.files[path] = StagedFile(path, content=content,
+                                          objects=objects)
+
+    def link(self, path, src, objects=None):
+
+        """Stage file src for file path, defining objects. The file is
+           referenced by its path, or hardlinked into the tmp dir in disk
+           mode."""
+        if self.mode == 'disk':
+            disk_path = self._disk_path(path)
+            try:
+                os.link(src, disk_path)
+            except OSError:
+                # probably not on the same filesystem, fallback to copy
+                shutil.copyfile(src, disk_path)
+        self.files[path] = StagedFile(path, src=src, objects=objects)
+
+    def clean(self):
+
+        """Remove the staging tmp dir, unless kept for inspection in disk
+           mode."""
+        if self.tmpdir.path is None:
+            return
+        if self.mode == 'disk':
+            logger.info("staging dir %s kept for inspection",
+                        self.tmpdir.path)
+        else:
+            self.tmpdir.clean()
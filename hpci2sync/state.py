@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+"""State of the last conf run: signatures of the input files, digests of the
+   installed files and counts, to check without parsing nor rendering
+   anything whether the deployed configuration is up to date."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import json
+import time
+import hashlib
+
+from hpci2sync.source import FilesystemSource
+
+STATE_VERSION = 1
+GLOBAL = '_global'  # inputs key of the files involved in all zones
+
+def tree_signature(paths, source):
+
+    """Returns a digest of the stat data of the given files and of all the
+       files under the given directories, as known by the filesystem
+       source. Missing paths are ignored."""
+    digest = hashlib.sha1()
+    for top in paths:
+        for path, mtime, size in source.stats(top):
+            digest.update(("%s %d %d\n" % (path, mtime, size))
+                          .encode('utf-8'))
+    return digest.hexdigest()
+
+def settings_signature(conf):
+
+    """Returns the signature of the input files which are not in
+       privatedata: the configuration file and the templates."""
+    return tree_signature([ conf.conf_file, conf.dir_templates ],
+                          FilesystemSource([ conf.dir_templates ]))
+
+def inputs_signatures(conf, source):
+
+    """Returns a dict of the signatures of the input files of every cluster
+       which is not excluded, plus the signature of the input files involved
+       in all zones under GLOBAL key."""
+    paths = [ conf.conf_file, conf.dir_templates ] + \
+            [ os.path.join(conf.dir_conf, zone)
+              for zone in [ 'master', 'global-templates' ] ]
+    signatures = { GLOBAL: tree_signature(paths, source) }
+    for cluster in source.listdir(conf.dir_equipments):
+        if cluster in conf.exclude_clusters:
+            continue
+        paths = [ os.path.join(top, cluster)
+                  for top in [ conf.dir_equipments, conf.dir_hieradata,
+                               conf.dir_conf ] ]
+        signatures[cluster] = tree_signature(paths, source)
+    return signatures
+
+def file_digest(path):
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as stream:
+        for block in iter(lambda: stream.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RunState(object):
+    """Compact state file written at the end of every conf run which
+       installed the configuration. For every installed file, the digest of
+       its content is recorded along with its size and mtime, so the digest
+       is computed again only for the files whose stat data changed."""
+
+    def __init__(self, path):
+
+        self.path = path
+        self.started = None
+        self.finished = None
+        self.commit = None
+        # cluster -> signature, only GLOBAL for git source
+        self.inputs = None
+        self.outputs = {}  # installed file -> [digest, size, mtime]
+        self.counts = {}
+
+    def load(self):
+
+        """Loads the state file, returns False if missing or invalid."""
+        try:
+            with open(self.path, 'r') as stream:
+                data = json.load(stream)
+            if data['version'] != STATE_VERSION:
+                raise ValueError("unsupported version %s" % (data['version']))
+            self.started = data['started']
+            self.finished = data['finished']
+            self.commit = data['commit']
+            self.inputs = data['inputs']
+            self.outputs = data['outputs']
+            self.counts = data['counts']
+        except (IOError, ValueError, KeyError) as exc:
+            logger.debug("unable to load state file %s: %s", self.path, exc)
+            return False
+        return True
+
+    def add_output(self, path):
+
+        stat = os.stat(path)
+        self.outputs[path] = [ file_digest(path), stat.st_size,
+                               int(stat.st_mtime) ]
+
+    def save(self):
+
+        self.finished = int(time.time())
+        data = { 'version': STATE_VERSION,
+                 'started': self.started,
+                 'finished': self.finished,
+                 'commit': self.commit,
+                 'inputs': self.inputs,
+                 'outputs': self.outputs,
+                 'counts': self.counts }
+        state_dir = os.path.dirname(self.path)
+        tmp_path = self.path + '.tmp'
+        try:
+            if not os.path.isdir(state_dir):
+                os.makedirs(state_dir)
+            with open(tmp_path, 'w') as stream:
+                json.dump(data, stream, indent=1, sort_keys=True)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as exc:
+            logger.warning("unable to save state file %s: %s",
+                           self.path, exc)
+
+    def stale_clusters(self, signatures):
+
+        """Returns the sorted list of clusters whose input signature differs
+           from the given signatures, including added and removed clusters,
+           and GLOBAL if the inputs of all zones changed."""
+        keys = set(self.inputs.keys()) | set(signatures.keys())
+        return sorted([ key for key in keys
+                        if self.inputs.get(key) != signatures.get(key) ])
+
+    def modified_outputs(self):
+
+        """Returns the sorted list of installed files which are missing or
+           whose content changed since the run."""
+        modified = []
+        for path, (digest, size, mtime) in self.outputs.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                modified.append(path)
+                continue
+            if stat.st_size == size and int(stat.st_mtime) == mtime:
+                continue
+            if stat.st_size != size or file_digest(path) != digest:
+                modified.append(path)
+        return sorted(modified)
@@ -48,13 +48,17 @@ setup(name='hpci2sync',
       platforms=['GNU/Linux', 'BSD'],
       keywords=['hpc', 'supercomputers', 'monitoring', 'icinga2'],
       install_requires=['clustershell',
-                        'jinja2' ],
+                        'jinja2',
+                        'PyYAML' ],
       description="hpci2sync is a icinga2 configuration manager for HPC "\
                   "clusters.",
       classifiers=[
           "Environment :: Console",
           "Operating System :: POSIX :: Linux",
           "Programming Language :: Python",
+          "Programming Language :: Python :: 2",
+          "Programming Language :: Python :: 2.7",
+          "Programming Language :: Python :: 3",
           "Topic :: Software Development :: Libraries :: Python Modules",
           "Topic :: System :: Clustering",
           "Topic :: System :: Distributed Computing"
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+"""Parse and render throughput of Python interpreters on a generated site
+   of CLUSTERS clusters of NODES compute nodes. The site is generated once,
+   then measured with every given interpreter, the current one by default:
+
+     python tests/bench_interpreters.py [-c CLUSTERS] [-n NODES] [PYTHON...]
+
+   For example, to compare python 2 and python 3:
+
+     python3 tests/bench_interpreters.py python2 python3"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+
+from sitegen import make_site, load_app, render_zones
+
+REPEATS = 3
+
+def measure(conf_file):
+
+    """Parses the site of the configuration file and renders it with the
+       templates, fragments cache disabled, then prints the timings."""
+    app = load_app(conf_file, 'conf', '--dry-run')
+    start = time.time()
+    app._parse_privatedata()
+    parse = time.time() - start
+    app._route_zones()
+    render = min([ render_zones(app)[0] for repeat in range(REPEATS) ])
+    equipments = sum([ len(cluster.equipments) for cluster in app.clusters ])
+    sys.stdout.write("python %s: %d equipments, parse %.2fs (%.0f/s), "
+                     "render %.3fs (%.0f/s)\n"
+                     % (sys.version.split()[0], equipments,
+                        parse, equipments / parse,
+                        render, equipments / render))
+    sys.stdout.flush()
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--clusters', type=int, default=10)
+    parser.add_argument('-n', '--nodes', type=int, default=1000)
+    parser.add_argument('--conf', help='measure this site only')
+    parser.add_argument('interpreters', nargs='*')
+    args = parser.parse_args()
+
+    if args.conf:
+        measure(args.conf)
+        return
+    root = tempfile.mkdtemp()
+    try:
+        conf_file = make_site(root, clusters=args.clusters, nodes=args.nodes)
+        for interpreter in args.interpreters or [ sys.executable ]:
+            subprocess.check_call([ interpreter, os.path.abspath(__file__),
+                                    '--conf', conf_file ])
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    main()
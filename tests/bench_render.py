@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+"""Throughput of hosts and zones files rendering with the shipped Jinja2
+   templates and with the native emitter, fragments cache disabled, on a
+   generated site of CLUSTERS clusters of NODES compute nodes:
+
+     python tests/bench_render.py [CLUSTERS [NODES]]"""
+
+import sys
+import shutil
+import tempfile
+
+from sitegen import make_site, load_app, render_zones
+
+REPEATS = 3
+
+def main():
+
+    clusters = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    nodes = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    root = tempfile.mkdtemp()
+    try:
+        conf_file = make_site(root, clusters=clusters, nodes=nodes)
+        app = load_app(conf_file, 'conf', '--dry-run')
+        from hpci2sync.emitter import NativeEmitter
+        app._parse_privatedata()
+        app._route_zones()
+        hosts = sum([ len(cluster.equipments) for cluster in app.clusters ])
+        results = {}
+        for name, emitter in [ ('jinja2', None),
+                               ('native', NativeEmitter()) ]:
+            timings = []
+            for repeat in range(REPEATS):
+                elapsed, files = render_zones(app, emitter)
+                timings.append(elapsed)
+            results[name] = files
+            sys.stdout.write("python %s, %s: %d hosts rendered in %.3fs "
+                             "(%.0f hosts/s)\n"
+                             % (sys.version.split()[0], name, hosts,
+                                min(timings), hosts / min(timings)))
+        sys.stdout.write("rendered files identical: %s\n"
+                         % (results['jinja2'] == results['native']))
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    main()
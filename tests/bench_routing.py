@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+"""Zones routing time of the single classification pass compared with the
+   former master and satellite passes, which evaluated every equipment
+   twice, on a generated site of CLUSTERS clusters of NODES compute nodes
+   (100k equipments by default):
+
+     python tests/bench_routing.py [CLUSTERS [NODES]]"""
+
+import sys
+import time
+import shutil
+import tempfile
+
+from sitegen import make_site, load_app
+
+REPEATS = 3
+
+def former_passes(app):
+
+    """Routes the equipments as the former master pass and per cluster
+       satellite passes, returns the buckets sizes."""
+    conf = app.conf
+    hosts = []
+    servers = []
+    for cluster in app.clusters:
+        for equipment in cluster:
+            if equipment.monitored_by_master(conf.profs_master):
+                equipment.ip = equipment.get_ip_netif('wan')
+                equipment.set_attrs()
+                hosts.append(equipment)
+                if equipment.category == 'server' and \
+                   not equipment.has_profile([conf.prof_monsat]):
+                    servers.append(equipment)
+    sizes = [ len(hosts), len(servers) ]
+    for cluster in app.clusters:
+        hosts = []
+        servers = []
+        nodes = []
+        for equipment in cluster:
+            if equipment.monitored_by_satellite(conf.profs_master):
+                admin_ip = equipment.get_ip_netif('administration')
+                if admin_ip is not None:
+                    equipment.ip = admin_ip
+                else:
+                    equipment.ip = equipment.get_ip_netif('management')
+                equipment.set_attrs()
+                if equipment.role in conf.nodes_roles:
+                    nodes.append(equipment)
+                else:
+                    hosts.append(equipment)
+                    if equipment.category == 'server':
+                        servers.append(equipment)
+        sizes.extend([ len(hosts), len(servers), len(nodes) ])
+    return sizes
+
+def classification(app):
+
+    """Routes the equipments with the classification pass, returns the
+       buckets sizes."""
+    app._route_zones()
+    routing = app.routing
+    sizes = [ len(routing.master_hosts), len(routing.master_endpoints) ]
+    for cluster in app.clusters:
+        zone = routing.satellites[cluster.name]
+        sizes.extend([ len(zone.hosts), len(zone.endpoints),
+                       len(zone.nodes) ])
+    return sizes
+
+def best(function, app):
+
+    timings = []
+    for repeat in range(REPEATS):
+        start = time.time()
+        sizes = function(app)
+        timings.append(time.time() - start)
+    return min(timings), sizes
+
+def main():
+
+    clusters = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    nodes = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    root = tempfile.mkdtemp()
+    try:
+        conf_file = make_site(root, clusters=clusters, nodes=nodes)
+        app = load_app(conf_file, 'conf', '--dry-run')
+        start = time.time()
+        app._parse_privatedata()
+        equipments = sum([ len(cluster.equipments)
+                           for cluster in app.clusters ])
+        sys.stdout.write("python %s: %d equipments parsed in %.1fs\n"
+                         % (sys.version.split()[0], equipments,
+                            time.time() - start))
+        former, former_sizes = best(former_passes, app)
+        single, single_sizes = best(classification, app)
+        sys.stdout.write("former passes: %.3fs\n" % (former))
+        sys.stdout.write("classification pass: %.3fs\n" % (single))
+        sys.stdout.write("same zones buckets: %s\n"
+                         % (former_sizes == single_sizes))
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+"""Startup time of hpci2sync: import time of hpci2sync.app measured with
+   python -X importtime, with its slowest imported modules, and wall time
+   of actions which must not load the conf action dependencies, on a
+   generated site:
+
+     python3 tests/bench_startup.py [-t TOP]"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+
+from sitegen import TOP, make_site, run
+
+REPEATS = 5
+
+def import_times():
+
+    """Returns the list of (module, self time, cumulative time) in seconds
+       of the modules imported by hpci2sync.app, as reported by python -X
+       importtime."""
+    environ = dict(os.environ)
+    environ['PYTHONPATH'] = TOP
+    process = subprocess.Popen([ sys.executable, '-X', 'importtime', '-c',
+                                 'import hpci2sync.app' ],
+                               stderr=subprocess.PIPE, env=environ)
+    output = process.communicate()[1].decode('utf-8')
+    times = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        times.append((fields[2].strip(), int(fields[0]) / 1e6,
+                      int(fields[1]) / 1e6))
+    return times
+
+def app_import_time():
+
+    """Returns the cumulative import time of hpci2sync.app in seconds, the
+       best of some runs."""
+    return min([ [ cumulative for module, own, cumulative in import_times()
+                   if module == 'hpci2sync.app' ][0]
+                 for repeat in range(REPEATS) ])
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--top', type=int, default=10,
+                        help='number of slowest modules reported')
+    args = parser.parse_args()
+
+    sys.stdout.write("python %s: hpci2sync.app imported in %.1fms\n"
+                     % (sys.version.split()[0], app_import_time() * 1000))
+    times = sorted(import_times(), key=lambda item: item[1], reverse=True)
+    for module, own, cumulative in times[:args.top]:
+        sys.stdout.write("  %-30s self %6.1fms cumulative %6.1fms\n"
+                         % (module, own * 1000, cumulative * 1000))
+
+    root = tempfile.mkdtemp()
+    try:
+        conf_file = make_site(root)
+        for action in [ [ '--help' ], [ 'cleanup', '--dry-run' ] ]:
+            timings = []
+            for repeat in range(REPEATS):
+                start = time.time()
+                code, output = run(conf_file, *action)
+                timings.append(time.time() - start)
+            sys.stdout.write("hpci2sync %s: %.1fms\n"
+                             % (' '.join(action), min(timings) * 1000))
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+"""Generator of small sites for the tests: privatedata tree, configuration
+   file and icinga2 directory, with YAML files written by hand to control
+   the order of their mappings and lists."""
+
+import os
+import pwd
+import sys
+import time
+import logging
+import subprocess
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROLES = { 'admin': [ 'monitoring::server', 'ntp::server' ],
+          'cn': [ 'slurm::node', 'cluster::common', 'ntp::client' ],
+          'virt': [ 'virt::host' ] }
+
+def write(path, lines):
+
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as stream:
+        stream.write(''.join([ line + '\n' for line in lines ]))
+
+def ordered(items, reverse):
+
+    return list(reversed(items)) if reverse else list(items)
+
+def make_site(root, clusters=2, nodes=8, reverse=False, extra_conf=None):
+
+    """Writes a site with the given number of clusters and compute nodes
+       per cluster in root, returns the path of its configuration file. With
+       reverse, all YAML mappings and lists are written in reverse order."""
+    pd = os.path.join(root, 'pd')
+    for index in range(clusters):
+        name = 'c%d' % (index)
+        prefix = 'c%d' % (index)
+        equipments = os.path.join(pd, 'monitoring', 'equipments', name)
+        hieradata = os.path.join(pd, 'hieradata', name)
+        write(os.path.join(pd, 'monitoring', 'conf', name, 'services.conf'),
+              [ '// %s services' % (name) ])
+        write(os.path.join(hieradata, 'cluster.yaml'),
+              [ 'cluster_prefix: %s' % (prefix) ])
+        write(os.path.join(equipments, 'server.yaml'),
+              ordered([ '%scn[1-%d]: {model: R630}' % (prefix, nodes),
+                        '%sadmin[1-2]: {model: R730}' % (prefix),
+                        '%svirt1: {model: R730}' % (prefix) ], reverse))
+        write(os.path.join(equipments, 'switch.yaml'),
+              [ '%ssw1: {model: X}' % (prefix) ])
+        for role, profiles in ROLES.items():
+            write(os.path.join(hieradata, 'roles', role + '.yaml'),
+                  [ 'profiles:' ] +
+                  [ '- profiles::' + profile
+                    for profile in ordered(profiles, reverse) ])
+        hosts = []
+        for node in range(1, nodes + 1):
+            hosts.append(('%scn%d' % (prefix, node),
+                          [ ('administration', '10.%d.0.%d' % (index, node)),
+                            ('bmc', '10.%d.1.%d' % (index, node)) ]))
+        for admin in range(1, 3):
+            hosts.append(('%sadmin%d' % (prefix, admin),
+                          [ ('administration',
+                             '10.%d.0.%d' % (index, 200 + admin)),
+                            ('wan', '192.168.%d.%d' % (index, admin)),
+                            ('bmc', '10.%d.1.%d' % (index, 200 + admin)) ]))
+        hosts.append(('%svirt1' % (prefix),
+                      [ ('administration', '10.%d.0.250' % (index)),
+                        ('wan', '192.168.%d.250' % (index)) ]))
+        hosts.append(('%ssw1' % (prefix),
+                      [ ('wan', '192.168.%d.100' % (index)) ]))
+        lines = [ 'master_network:' ]
+        for host, netifs in ordered(hosts, reverse):
+            lines.extend([ '  %s:' % (host),
+                           '    fqdn: %s.example.com' % (host),
+                           '    networks:' ])
+            for network, ip in ordered(netifs, reverse):
+                lines.append('      %s: {IP: %s}' % (network, ip))
+        write(os.path.join(hieradata, 'network.yaml'), lines)
+    for zone in [ 'master', 'global-templates' ]:
+        write(os.path.join(pd, 'monitoring', 'conf', zone, 'templates.conf'),
+              [ '// %s' % (zone) ])
+    for zone in [ 'master', 'global-templates' ] + \
+                [ 'c%d' % (index) for index in range(clusters) ]:
+        os.makedirs(os.path.join(root, 'icinga2', 'zones.d', zone))
+    write(os.path.join(root, 'keys.ini'), [ '[keys]' ])
+    conf_file = os.path.join(root, 'conf.ini')
+    write(conf_file,
+          [ '[paths]',
+            'icinga2 = %s/icinga2' % (root),
+            'privatedata = %s' % (pd),
+            'ca = %s/ca' % (root),
+            'tmp = %s/tmp' % (root),
+            'cache = %s/cache' % (root),
+            'keys = %s/keys.ini' % (root),
+            '[conf]',
+            'templates = %s/templates' % (TOP),
+            'owner = %s' % (pwd.getpwuid(os.getuid()).pw_name) ] +
+          (extra_conf or []))
+    return conf_file
+
+def run(conf_file, *args, **env):
+
+    """Runs hpci2sync with the configuration file and args, the given
+       environment variables being added. Returns its exit code and
+       output."""
+    environ = dict(os.environ)
+    environ['PYTHONPATH'] = TOP
+    environ.update(env)
+    process = subprocess.Popen([ sys.executable,
+                                 os.path.join(TOP, 'scripts', 'hpci2sync'),
+                                 '-c', conf_file ] + list(args),
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, env=environ)
+    output = process.communicate()[0].decode('utf-8')
+    return process.returncode, output
+
+def load_app(conf_file, *args):
+
+    """Returns the application initialized as hpci2sync run with the
+       configuration file and args, for in-process benchmarks. Only errors
+       are logged."""
+    if TOP not in sys.path:
+        sys.path.insert(0, TOP)
+    from hpci2sync.app import MainApp
+    argv = sys.argv
+    sys.argv = [ 'hpci2sync', '-c', conf_file ] + list(args)
+    try:
+        app = MainApp()
+    finally:
+        sys.argv = argv
+    logging.getLogger('hpci2sync').setLevel(logging.ERROR)
+    return app
+
+def render_zones(app, emitter=None):
+
+    """Renders the hosts and zones files of all zones routed by the
+       application with the emitter, or the templates if None, fragments
+       cache disabled. Returns the elapsed time and the dict of rendered
+       files contents by path."""
+    from hpci2sync.fragcache import FragmentsCache
+    from hpci2sync.staging import StagingArea
+
+    app.fragments = FragmentsCache(os.devnull, 0)
+    app.emitter = emitter
+    app.staging = StagingArea('memory', app.conf.dir_tmp, 1 << 40)
+    start = time.time()
+    app._gen_zone_hosts('master', app.routing.master_hosts)
+    app._gen_zone_zones('master', app.routing.master_endpoints)
+    for name, zone in sorted(app.routing.satellites.items()):
+        app._gen_zone_hosts(name, zone.hosts, zone.nodes)
+        app._gen_zone_zones(name, zone.endpoints)
+    elapsed = time.time() - start
+    return elapsed, dict([ (staged.path, staged.read())
+                           for staged in app.staging ])
+
+def read_tree(top):
+
+    """Returns the dict of the contents of all files under top, by
+       relative path."""
+    contents = {}
+    for root, directories, filenames in os.walk(top):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            with open(path, 'rb') as stream:
+                contents[os.path.relpath(path, top)] = stream.read()
+    return contents
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+import json
+import base64
+import threading
+import unittest
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:  # python 2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+from hpci2sync.api import ApiRequest, ApiClient, modifications
+from hpci2sync.semdiff import ObjectsDiff, new_object
+from hpci2sync.app import MainApp
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Records the requests and answers 404 for objects named missing*. The
+       connection is closed after every response, without notifying the
+       client, when the server close flag is set."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+
+        length = int(self.headers['Content-Length'])
+        body = json.loads(self.rfile.read(length).decode('utf-8'))
+        with self.server.lock:
+            self.server.received.append((self.path, body,
+                                         self.headers['Authorization']))
+        if self.path.split('/')[-1].startswith('missing'):
+            status, data = 404, b'{"error": 404, "status": "No objects found."}'
+        else:
+            status, data = 200, b'{"results": []}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        if self.server.close:
+            self.close_connection = True
+
+    def log_message(self, *args):
+
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+class ApiClientTest(unittest.TestCase):
+    """ApiClient.push against a local stub of icinga2 REST API."""
+
+    def setUp(self):
+
+        self.server = StubServer(('127.0.0.1', 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.connections = 0
+        self.server.received = []
+        self.server.close = False
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def client(self, **kwargs):
+
+        return ApiClient('http://127.0.0.1:%d' % (self.server.server_port),
+                         'root', 'secret', **kwargs)
+
+    @staticmethod
+    def requests(names):
+
+        return [ ApiRequest('Host', name, { 'vars.rack': name })
+                 for name in names ]
+
+    def test_batches(self):
+
+        requests = self.requests([ 'host%d' % (index)
+                                   for index in range(10) ])
+        results = self.client(workers=2, batch=3).push(requests)
+        self.assertEqual([ request for request, error in results ], requests)
+        self.assertEqual([ error for request, error in results ], [None] * 10)
+        received = sorted(self.server.received)
+        self.assertEqual([ path for path, body, auth in received ],
+                         sorted([ request.path for request in requests ]))
+        self.assertEqual(received[0][1], { 'attrs': { 'vars.rack': 'host0' } })
+        credentials = base64.b64encode(b'root:secret').decode('ascii')
+        self.assertEqual(set([ auth for path, body, auth in received ]),
+                         set([ 'Basic ' + credentials ]))
+        # one keep-alive connection per worker at most
+        self.assertLessEqual(self.server.connections, 2)
+
+    def test_connection_reuse(self):
+
+        results = self.client(workers=1).push(self.requests([ 'a', 'b', 'c' ]))
+        self.assertEqual([ error for request, error in results ], [None] * 3)
+        self.assertEqual(len(self.server.received), 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_retry_closed_connection(self):
+
+        self.server.close = True
+        client = self.client(workers=1)
+        resets = []
+        reset = client._reset
+        def counted_reset():
+            resets.append(None)
+            reset()
+        client._reset = counted_reset
+        results = client.push(self.requests([ 'a', 'b', 'c' ]))
+        self.assertEqual([ error for request, error in results ], [None] * 3)
+        self.assertEqual([ path.split('/')[-1]
+                           for path, body, auth in self.server.received ],
+                         [ 'a', 'b', 'c' ])
+        self.assertEqual(self.server.connections, 3)
+        # requests following the first one failed once on the closed
+        # connection before being retried
+        self.assertEqual(len(resets), 2)
+
+    def test_http_error(self):
+
+        results = self.client(workers=1).push(
+                    self.requests([ 'a', 'missing', 'b' ]))
+        errors = [ error for request, error in results ]
+        self.assertEqual(errors[0], None)
+        self.assertTrue(errors[1].startswith('HTTP 404: '), errors[1])
+        self.assertIn('No objects found.', errors[1])
+        self.assertEqual(errors[2], None)
+        # the connection is still reused after an error response
+        self.assertEqual(self.server.connections, 1)
+
+
+def host(name, address='10.0.0.1', imports=None, **objvars):
+
+    return new_object('Host', name, imports or [ 'hpc-equipment' ],
+                      { 'display_name': name, 'address': address }, objvars)
+
+def zone(name, parent):
+
+    return new_object('Zone', name, attrs={ 'parent': parent,
+                                            'endpoints': [ name ] })
+
+def endpoint(name, address):
+
+    return new_object('Endpoint', name, attrs={ 'host': address })
+
+def objects_diff(old, new):
+
+    diff = ObjectsDiff()
+    diff.compare(old, new)
+    return diff
+
+
+class ModificationsTest(unittest.TestCase):
+    """Split of objects changes between API requests and changes requiring
+       a reload."""
+
+    def test_host_changes(self):
+
+        diff = objects_diff([ host('a', model='R630'), host('b') ],
+                            [ host('a', model='R730'),
+                              host('b', address='10.0.0.2', rack='r1') ])
+        requests, unsupported = modifications(diff)
+        self.assertEqual(unsupported, 0)
+        self.assertEqual([ (request.path, request.attrs)
+                           for request in requests ],
+                         [ ('/v1/objects/hosts/a', { 'vars.model': 'R730' }),
+                           ('/v1/objects/hosts/b',
+                            { 'address': '10.0.0.2', 'vars.rack': 'r1' }) ])
+
+    def test_added_removed(self):
+
+        diff = objects_diff([ host('a'), host('b') ], [ host('b'), host('c') ])
+        self.assertEqual(modifications(diff), ([], 2))
+
+    def test_imports(self):
+
+        diff = objects_diff([ host('a') ],
+                            [ host('a', imports=[ 'hpc-compute-node' ]) ])
+        self.assertEqual(modifications(diff), ([], 1))
+
+    def test_removed_var(self):
+
+        diff = objects_diff([ host('a', model='R630', rack='r1') ],
+                            [ host('a', model='R730') ])
+        self.assertEqual(modifications(diff), ([], 1))
+
+    def test_zones_endpoints(self):
+
+        diff = objects_diff([ endpoint('a', '10.0.0.1'), zone('a', 'c0'),
+                              zone('b', 'c0') ],
+                            [ endpoint('a', '10.0.0.2'), zone('a', 'master'),
+                              zone('b', 'c0') ])
+        self.assertEqual(modifications(diff), ([], 2))
+
+
+class ApiRequestsTest(unittest.TestCase):
+    """Reload decision of the conf action with icinga2 API enabled."""
+
+    def api_requests(self, changes):
+
+        # only the changes are used, the application is not initialized
+        app = MainApp.__new__(MainApp)
+        return app._api_requests(changes)
+
+    def test_pushed(self):
+
+        diff = objects_diff([ host('a', model='R630') ],
+                            [ host('a', model='R730') ])
+        requests, reload_needed = self.api_requests(
+                                    [ ('c0/hosts.conf', 'changed', diff) ])
+        self.assertEqual(len(requests), 1)
+        self.assertFalse(reload_needed)
+
+    def test_file_without_objects(self):
+
+        diff = objects_diff([ host('a', model='R630') ],
+                            [ host('a', model='R730') ])
+        requests, reload_needed = self.api_requests(
+                                    [ ('c0/hosts.conf', 'changed', diff),
+                                      ('c0/services.conf', 'changed', None) ])
+        self.assertEqual(len(requests), 1)
+        self.assertTrue(reload_needed)
+
+    def test_unsupported(self):
+
+        diff = objects_diff([ zone('a', 'c0') ], [ zone('a', 'master') ])
+        requests, reload_needed = self.api_requests(
+                                    [ ('c0/zones.conf', 'changed', diff) ])
+        self.assertEqual(requests, [])
+        self.assertTrue(reload_needed)
+
+    def test_unchanged(self):
+
+        self.assertEqual(self.api_requests([]), ([], False))
+
+
+if __name__ == '__main__':
+    unittest.main()
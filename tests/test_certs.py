@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+import os
+import sys
+import stat
+import shutil
+import tempfile
+import unittest
+
+from sitegen import make_site, run, read_tree, write
+
+from hpci2sync.journal import CertsJournal
+
+# stub of icinga2 and openssl commands creating their output files and
+# logging their arguments, the signature of the CSR of FAIL_SIGN host fails
+STUB = """#!%s
+import os
+import sys
+args = sys.argv[1:]
+fail = os.environ.get('FAIL_SIGN')
+if 'sign-csr' in args and fail and \\
+   os.path.basename(args[args.index('--csr') + 1]) == fail + '.csr':
+    sys.exit(1)
+for option in [ '--csr', '--key', '--cert', '-out' ]:
+    if option in args:
+        open(args[args.index(option) + 1], 'w').close()
+with open(os.environ['STUB_LOG'], 'a') as stream:
+    stream.write(' '.join([ os.path.basename(sys.argv[0]) ] + args) + '\\n')
+"""
+
+# steps run by the commands logged by the stubs
+COMMANDS = [ ('icinga2 pki new-cert', 'new-cert'),
+             ('icinga2 pki sign-csr', 'sign'),
+             ('openssl', 'encrypt') ]
+
+class CertsResumeTest(unittest.TestCase):
+    """Certificates creation interrupted by a failed signature is resumed
+       from the journal by the next run."""
+
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+        self.conf_file = make_site(self.root, clusters=1)
+        write(os.path.join(self.root, 'keys.ini'), [ '[keys]', 'c0 = secret' ])
+        os.makedirs(os.path.join(self.root, 'ca'))
+        self.dir_certs = os.path.join(self.root, 'pd', 'files', 'c0',
+                                      'icinga2', 'certs')
+        os.makedirs(self.dir_certs)
+        self.dir_bin = os.path.join(self.root, 'bin')
+        os.makedirs(self.dir_bin)
+        for command in [ 'icinga2', 'openssl' ]:
+            path = os.path.join(self.dir_bin, command)
+            write(path, [ STUB % (sys.executable) ])
+            os.chmod(path, stat.S_IRWXU)
+        self.log = os.path.join(self.root, 'stub.log')
+        self.journal = os.path.join(self.root, 'cache', 'certs.journal')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root)
+
+    def certs(self, action='certs', **env):
+
+        if os.path.exists(self.log):
+            os.unlink(self.log)
+        write(self.log, [])
+        return run(self.conf_file, action, STUB_LOG=self.log,
+                   PATH=self.dir_bin + os.pathsep + os.environ['PATH'],
+                   **env)
+
+    def steps(self):
+
+        """Returns the dict of the steps run by commands, by host."""
+        steps = {}
+        with open(self.log) as stream:
+            for line in stream:
+                host = [ os.path.basename(arg).split('.')[0]
+                         for arg in line.split()
+                         if arg.endswith(('.csr', '.key')) ][0]
+                for command, step in COMMANDS:
+                    if line.startswith(command + ' '):
+                        steps.setdefault(host, []).append(step)
+        return steps
+
+    def test_resume(self):
+
+        code, output = self.certs(FAIL_SIGN='c0admin2')
+        self.assertNotEqual(code, 0, output)
+        self.assertEqual(self.steps(),
+                         { 'c0admin1': [ 'new-cert', 'sign', 'encrypt' ],
+                           'c0admin2': [ 'new-cert' ] })
+        with open(self.journal) as stream:
+            journal = stream.read()
+        self.assertEqual(journal.splitlines()[-1], 'c0admin2 new-cert')
+        # the run is killed while recording the next step
+        with open(self.journal, 'a') as stream:
+            stream.write('c0virt1 new-')
+        finished = os.stat(os.path.join(self.dir_certs, 'c0admin1.key.enc'))
+
+        code, output = self.certs()
+        self.assertEqual(code, 0, output)
+        self.assertIn("resuming creation of certificate and key for c0admin2 "
+                      "at step sign", output)
+        # finished hosts are not touched again
+        self.assertEqual(self.steps(),
+                         { 'c0admin2': [ 'sign', 'encrypt' ],
+                           'c0virt1': [ 'new-cert', 'sign', 'encrypt' ] })
+        self.assertEqual(os.stat(os.path.join(self.dir_certs,
+                                              'c0admin1.key.enc')).st_mtime,
+                         finished.st_mtime)
+        for host in [ 'c0admin1', 'c0admin2', 'c0virt1' ]:
+            for suffix in [ '.crt', '.key.enc' ]:
+                path = os.path.join(self.dir_certs, host + suffix)
+                self.assertTrue(os.path.exists(path), path)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.join(
+                           self.dir_certs, 'c0admin2.key.enc')).st_mode),
+                         0o400)
+        # the completed run removes the journal
+        self.assertFalse(os.path.exists(self.journal))
+
+        code, output = self.certs()
+        self.assertEqual(code, 0, output)
+        self.assertEqual(self.steps(), {})
+
+    def test_sync(self):
+
+        """The sync action creates the certificates while the zones are
+           synced, the zones being the same as with the conf action."""
+        code, output = self.certs('sync')
+        self.assertEqual(code, 0, output)
+        self.assertEqual(sorted(self.steps().keys()),
+                         [ 'c0admin1', 'c0admin2', 'c0virt1' ])
+        synced = read_tree(os.path.join(self.root, 'icinga2', 'zones.d'))
+        self.assertIn(os.path.join('c0', 'hosts.conf'), synced)
+        root = tempfile.mkdtemp()
+        try:
+            code, output = run(make_site(root, clusters=1), 'conf')
+            self.assertEqual(code, 0, output)
+            self.assertEqual(read_tree(os.path.join(root, 'icinga2',
+                                                    'zones.d')), synced)
+        finally:
+            shutil.rmtree(root)
+
+
+class CertsJournalTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'certs.journal')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root)
+
+    def test_invalidation(self):
+
+        journal = CertsJournal(self.path)
+        for step in CertsJournal.STEPS:
+            journal.record('cn1', step)
+        journal.record('cn1', 'sign')
+        journal.close()
+        self.assertEqual(journal.steps('cn1'), [ 'new-cert', 'sign' ])
+        loaded = CertsJournal(self.path)
+        loaded.load()
+        self.assertEqual(loaded.steps('cn1'), [ 'new-cert', 'sign' ])
+
+    def test_truncated(self):
+
+        write(self.path, [ 'cn1 new-cert', 'cn1 sign', 'cn2 new-cert',
+                           'cn2 si' ])
+        journal = CertsJournal(self.path)
+        journal.load()
+        self.assertEqual(journal.steps('cn1'), [ 'new-cert', 'sign' ])
+        self.assertEqual(journal.steps('cn2'), [ 'new-cert' ])
+
+    def test_missing_output(self):
+
+        output = os.path.join(self.root, 'cn1.crt')
+        journal = CertsJournal(self.path)
+        journal.record('cn1', 'new-cert')
+        journal.record('cn1', 'sign')
+        journal.close()
+        outputs = dict([ (step, []) for step in CertsJournal.STEPS ])
+        outputs['sign'] = [ output ]
+        self.assertEqual(journal.resume('cn1', outputs), 1)
+        write(output, [])
+        self.assertEqual(journal.resume('cn1', outputs), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
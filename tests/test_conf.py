@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from hpci2sync.conf import ConfRun
+
+
+class ConfTestCase(unittest.TestCase):
+    """Parses configuration files written in a temporary directory."""
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.conf = ConfRun()
+        self.conf.conf_file = os.path.join(self.tmpdir, 'conf.ini')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmpdir)
+
+    def parse(self, content):
+
+        with open(self.conf.conf_file, 'w') as stream:
+            stream.write(content)
+        self.conf.parse()
+
+
+class ConflictsConfTest(ConfTestCase):
+
+    def test_default(self):
+
+        self.parse("")
+        self.assertEqual(self.conf.conflicts, 'warn')
+
+    def test_conf_section(self):
+
+        self.parse("[conf]\nconflicts = fail\n")
+        self.assertEqual(self.conf.conflicts, 'fail')
+
+    def test_networks_section(self):
+
+        self.parse("[networks]\nconflicts = ignore\n")
+        self.assertEqual(self.conf.conflicts, 'ignore')
+
+    def test_invalid(self):
+
+        self.assertRaises(ValueError, self.parse,
+                          "[conf]\nconflicts = abort\n")
+        self.assertRaises(ValueError, self.parse,
+                          "[networks]\nconflicts = no\n")
+
+
+class RendererConfTest(ConfTestCase):
+
+    def test_renderers(self):
+
+        self.parse("")
+        self.assertEqual(self.conf.renderer, 'jinja2')
+        self.parse("[conf]\nrenderer = native\n")
+        self.assertEqual(self.conf.renderer, 'native')
+
+    def test_invalid(self):
+
+        self.assertRaises(ValueError, self.parse,
+                          "[conf]\nrenderer = Native\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sitegen import make_site, run, load_app, read_tree
+
+from hpci2sync.conflicts import ConflictsDetector
+
+class ConflictsTestCase(unittest.TestCase):
+    """Site in which equipment c1cn1 has the administration IP address and
+       the FQDN of equipment c0cn1."""
+
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root)
+
+    def make_site(self, conflicts, pipeline='no'):
+
+        conf_file = make_site(self.root,
+                              extra_conf=[ 'conflicts = %s' % (conflicts),
+                                           'pipeline = %s' % (pipeline) ])
+        path = os.path.join(self.root, 'pd', 'hieradata', 'c1',
+                            'network.yaml')
+        with open(path) as stream:
+            content = stream.read()
+        content = content.replace('c1cn1.example.com', 'c0cn1.example.com') \
+                         .replace('{IP: 10.1.0.1}', '{IP: 10.0.0.1}')
+        with open(path, 'w') as stream:
+            stream.write(content)
+        return conf_file
+
+
+class ConflictsDetectorTest(ConflictsTestCase):
+
+    def test_detect(self):
+
+        app = load_app(self.make_site('ignore'), 'conf', '--dry-run')
+        app._parse_privatedata()
+        detector = ConflictsDetector()
+        self.assertEqual(detector.check(app.clusters), 2)
+        self.assertEqual(list(detector.ip_conflicts.keys()),
+                         [ ('administration', '10.0.0.1') ])
+        self.assertEqual([ owner[:2] for owner in
+                           detector.ip_conflicts[('administration',
+                                                  '10.0.0.1')] ],
+                         [ ('c0', 'c0cn1'), ('c1', 'c1cn1') ])
+        self.assertEqual([ owner[:2] for owner in
+                           detector.fqdn_conflicts['c0cn1.example.com'] ],
+                         [ ('c0', 'c0cn1'), ('c1', 'c1cn1') ])
+
+    def test_no_conflict(self):
+
+        conf_file = make_site(self.root)
+        app = load_app(conf_file, 'conf', '--dry-run')
+        app._parse_privatedata()
+        self.assertEqual(ConflictsDetector().check(app.clusters), 0)
+
+
+class ConflictsPolicyTest(ConflictsTestCase):
+
+    def test_fail(self):
+
+        conf_file = self.make_site('fail')
+        code, output = run(conf_file, 'conf')
+        self.assertEqual(code, 1, output)
+        self.assertIn("2 IP address or FQDN conflicts detected, aborting",
+                      output)
+        self.assertEqual(read_tree(os.path.join(self.root, 'icinga2')), {})
+
+    def test_fail_pipeline(self):
+
+        conf_file = self.make_site('fail', pipeline='yes')
+        code, output = run(conf_file, 'conf')
+        self.assertEqual(code, 1, output)
+        self.assertEqual(read_tree(os.path.join(self.root, 'icinga2')), {})
+
+    def test_warn(self):
+
+        conf_file = self.make_site('warn')
+        code, output = run(conf_file, 'conf')
+        self.assertEqual(code, 0, output)
+        self.assertIn("FQDN c0cn1.example.com is shared by", output)
+        self.assertNotEqual(read_tree(os.path.join(self.root, 'icinga2')), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sitegen import make_site, run, read_tree
+
+class DeterminismTest(unittest.TestCase):
+    """Repeated conf runs on unchanged inputs, and on the same inputs
+       written in another order, must produce byte-identical files."""
+
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root)
+
+    def sync(self, name, reverse=False, seed='1'):
+
+        conf_file = make_site(os.path.join(self.root, name), reverse=reverse)
+        code, output = run(conf_file, 'conf', PYTHONHASHSEED=seed)
+        self.assertEqual(code, 0, output)
+        return conf_file, output
+
+    def zones(self, name):
+
+        return read_tree(os.path.join(self.root, name, 'icinga2', 'zones.d'))
+
+    def test_repeated_runs(self):
+
+        conf_file, output = self.sync('site')
+        files = self.zones('site')
+        self.assertTrue(files)
+        for seed in [ '2', '3' ]:
+            code, output = run(conf_file, 'conf', PYTHONHASHSEED=seed)
+            self.assertEqual(code, 0, output)
+            self.assertIn("0 files installed, %d unchanged" % (len(files)),
+                          output)
+            self.assertEqual(self.zones('site'), files)
+
+    def test_inputs_order(self):
+
+        self.sync('site', seed='1')
+        self.sync('reversed', reverse=True, seed='2')
+        self.assertEqual(self.zones('site'), self.zones('reversed'))
+
+    def test_sorted_profiles(self):
+
+        self.sync('site')
+        hosts = self.zones('site')['c0/hosts.conf'].decode('utf-8')
+        # the role file lists slurm::node first
+        self.assertIn('vars.profiles = ["cluster::common", "ntp::client", '
+                      '"slurm::node"]', hosts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+import os
+import pwd
+import shutil
+import tempfile
+import unittest
+
+from sitegen import make_site, run, read_tree, write
+
+from hpci2sync.generations import Generations
+from hpci2sync.install import InstallTarget
+from hpci2sync.staging import StagingArea
+
+OWNER = pwd.getpwuid(os.getuid()).pw_name
+
+class GenerationsTest(unittest.TestCase):
+    """Generations of zones.d snapshots in a temporary icinga2 directory."""
+
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+        self.dir_icinga2 = os.path.join(self.root, 'icinga2')
+        self.dir_zones = os.path.join(self.dir_icinga2, 'zones.d')
+        write(os.path.join(self.dir_zones, 'master', 'hosts.conf'),
+              [ '// hosts' ])
+        write(os.path.join(self.dir_zones, 'c0', 'hosts.conf'),
+              [ '// c0 hosts' ])
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root)
+
+    def install(self, files, retention=3):
+
+        """Installs the files contents given by path in a new generation."""
+        staging = StagingArea('memory', os.path.join(self.root, 'tmp'),
+                              1 << 20)
+        for path, content in files.items():
+            staging.add(path, content)
+        target = InstallTarget('default', self.dir_icinga2, OWNER, retention)
+        result = target.install(staging)
+        staging.clean()
+        return result
+
+    def gen_path(self, gen, path):
+
+        return os.path.join(self.dir_icinga2, 'zones.gen', str(gen), path)
+
+    def test_migration(self):
+
+        result = self.install({ 'master/hosts.conf': u'// new hosts\n' })
+        self.assertTrue(result.ok, result.error)
+        self.assertEqual(os.readlink(self.dir_zones),
+                         os.path.join('zones.gen', '2'))
+        self.assertEqual(read_tree(os.path.join(self.dir_icinga2,
+                                                'zones.gen', '1')),
+                         { 'master/hosts.conf': b'// hosts\n',
+                           'c0/hosts.conf': b'// c0 hosts\n' })
+        self.assertEqual(read_tree(self.dir_zones),
+                         { 'master/hosts.conf': b'// new hosts\n',
+                           'c0/hosts.conf': b'// c0 hosts\n' })
+
+    def test_hardlinks(self):
+
+        self.install({ 'master/hosts.conf': u'// new hosts\n' })
+        # unchanged files are shared with the previous generation, changed
+        # files are new files
+        self.assertTrue(os.path.samefile(self.gen_path(1, 'c0/hosts.conf'),
+                                         self.gen_path(2, 'c0/hosts.conf')))
+        self.assertFalse(os.path.samefile(
+                           self.gen_path(1, 'master/hosts.conf'),
+                           self.gen_path(2, 'master/hosts.conf')))
+
+    def test_unchanged(self):
+
+        self.install({ 'master/hosts.conf': u'// new hosts\n' })
+        result = self.install({ 'master/hosts.conf': u'// new hosts\n' })
+        self.assertEqual(result.unchanged, [ 'master/hosts.conf' ])
+        self.assertEqual(Generations(self.dir_icinga2, 3).list(), [ 1, 2 ])
+
+    def test_prune(self):
+
+        for index in range(4):
+            self.install({ 'master/hosts.conf': u'// %d\n' % (index) },
+                         retention=2)
+        generations = Generations(self.dir_icinga2, 2)
+        self.assertEqual(generations.list(), [ 4, 5 ])
+        self.assertEqual(generations.current(), 5)
+
+    def test_prune_current(self):
+
+        for index in range(2):
+            self.install({ 'master/hosts.conf': u'// %d\n' % (index) })
+        generations = Generations(self.dir_icinga2, 1)
+        generations.switch(1)
+        generations.prune()
+        self.assertEqual(generations.list(), [ 1, 3 ])
+        self.assertEqual(generations.current(), 1)
+
+    def test_switch(self):
+
+        self.install({ 'master/hosts.conf': u'// new hosts\n' })
+        generations = Generations(self.dir_icinga2, 3)
+        # left over by an interrupted switch
+        os.symlink('zones.gen/2', self.dir_zones + '.tmp')
+        generations.switch(1)
+        self.assertEqual(generations.current(), 1)
+        self.assertFalse(os.path.lexists(self.dir_zones + '.tmp'))
+        self.assertEqual(read_tree(self.dir_zones)['master/hosts.conf'],
+                         b'// hosts\n')
+
+    def test_discard_failed(self):
+
+        self.install({ 'master/hosts.conf': u'// new hosts\n' })
+        result = self.install({ 'master/hosts.conf': u'// newer hosts\n',
+                                'c1/hosts.conf': u'// c1 hosts\n' })
+        # zone c1 directory does not exist
+        self.assertFalse(result.ok)
+        generations = Generations(self.dir_icinga2, 3)
+        self.assertEqual(generations.list(), [ 1, 2 ])
+        self.assertEqual(generations.current(), 2)
+        self.assertEqual(read_tree(self.dir_zones)['master/hosts.conf'],
+                         b'// new hosts\n')
+
+    def test_previous(self):
+
+        generations = Generations(self.dir_icinga2, 3)
+        self.assertRaises(ValueError, generations.previous)
+        for index in range(2):
+            self.install({ 'master/hosts.conf': u'// %d\n' % (index) })
+        self.assertEqual(generations.previous(), 2)
+        self.assertEqual(generations.previous(1), 1)
+        self.assertRaises(ValueError, generations.previous, 4)
+        generations.switch(1)
+        self.assertRaises(ValueError, generations.previous)
+
+
+class RollbackTest(unittest.TestCase):
+    """Conf runs with generations and rollback action on a generated
+       site."""
+
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+        self.conf_file = make_site(self.root,
+                                   extra_conf=[ 'generations = 3' ])
+        self.services = os.path.join(self.root, 'pd', 'monitoring', 'conf',
+                                     'c0', 'services.conf')
+        self.dir_zones = os.path.join(self.root, 'icinga2', 'zones.d')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root)
+
+    def conf(self, services):
+
+        write(self.services, [ services ])
+        code, output = run(self.conf_file, 'conf')
+        self.assertEqual(code, 0, output)
+        return read_tree(self.dir_zones)
+
+    def test_rollback(self):
+
+        first = self.conf('// first')
+        second = self.conf('// second')
+        self.assertEqual(os.readlink(self.dir_zones),
+                         os.path.join('zones.gen', '3'))
+        state = os.path.join(self.root, 'cache', 'state.json')
+        self.assertTrue(os.path.exists(state))
+
+        code, output = run(self.conf_file, 'rollback', '--dry-run')
+        self.assertEqual(code, 0, output)
+        self.assertEqual(read_tree(self.dir_zones), second)
+
+        code, output = run(self.conf_file, 'rollback')
+        self.assertEqual(code, 0, output)
+        self.assertEqual(read_tree(self.dir_zones), first)
+        # the next conf run must consider all zones
+        self.assertFalse(os.path.exists(state))
+
+        code, output = run(self.conf_file, 'rollback', '--to', '3')
+        self.assertEqual(code, 0, output)
+        self.assertEqual(read_tree(self.dir_zones), second)
+
+        code, output = run(self.conf_file, 'rollback', '--to', '9')
+        self.assertEqual(code, 1, output)
+        self.assertIn("generation 9 not found", output)
+        self.assertEqual(read_tree(self.dir_zones), second)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+import io
+import unittest
+
+import yaml
+
+from hpci2sync.hieradata import NetworkExtractor
+
+NETWORK = b"""
+defaults: &adm
+  IP: 10.0.0.1
+master_network:
+  host1:
+    fqdn: host1.example.com
+    networks:
+      administration: *adm
+  host2:
+    <<: {fqdn: host2.example.com}
+    networks:
+      wan:
+        IP: 192.168.0.2
+"""
+
+class NetworkExtractorTest(unittest.TestCase):
+
+    def extract(self, data, known=None):
+
+        return NetworkExtractor(io.BytesIO(data)).extract(known)
+
+    def test_streamed(self):
+
+        data = b"master_network:\n" \
+               b"  host1:\n" \
+               b"    fqdn: host1.example.com\n" \
+               b"    role: skipped\n" \
+               b"    networks:\n" \
+               b"      wan: {IP: 192.168.0.1, mac: skipped}\n"
+        self.assertEqual(self.extract(data),
+                         [ ('host1', { 'fqdn': 'host1.example.com',
+                                       'networks': {
+                                         'wan': { 'IP': '192.168.0.1' } } }) ])
+
+    def test_aliases_and_merge_keys(self):
+
+        expected = yaml.safe_load(io.BytesIO(NETWORK))['master_network']
+        self.assertEqual(dict(self.extract(NETWORK)), expected)
+
+    def test_duplicated_host_keeps_last_params(self):
+
+        data = b"master_network:\n" \
+               b"  host1: {fqdn: first}\n" \
+               b"  host2: {fqdn: other}\n" \
+               b"  host1: {fqdn: last}\n"
+        self.assertEqual(self.extract(data),
+                         [ ('host1', { 'fqdn': 'last' }),
+                           ('host2', { 'fqdn': 'other' }) ])
+
+    def test_unknown_hosts_params_not_built(self):
+
+        data = b"master_network:\n" \
+               b"  host1: {fqdn: host1}\n" \
+               b"  host2: {fqdn: host2}\n"
+        self.assertEqual(self.extract(data, known=[ 'host2' ]),
+                         [ ('host1', None), ('host2', { 'fqdn': 'host2' }) ])
+        # loaded with safe_load, in dict order with python 2
+        self.assertEqual(dict(self.extract(NETWORK, known=[ 'host2' ]))
+                         ['host1'], None)
+
+    def test_errors(self):
+
+        self.assertRaises(KeyError, self.extract, b"other: 1\n")
+        self.assertRaises(yaml.YAMLError, self.extract,
+                          b"master_network:\n  host1: [\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
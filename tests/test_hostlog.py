@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+import logging
+import unittest
+
+from hpci2sync.hostlog import HostsLog
+
+class RecordsHandler(logging.Handler):
+
+    def __init__(self):
+
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+
+        self.messages.append(record.getMessage())
+
+
+class HostsLogTest(unittest.TestCase):
+    """Per host events aggregated in folded nodesets."""
+
+    def setUp(self):
+
+        self.logger = logging.getLogger('hpci2sync.tests.hostlog')
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        self.handler = RecordsHandler()
+        self.logger.addHandler(self.handler)
+        self.hostslog = HostsLog(self.logger)
+
+    def tearDown(self):
+
+        self.logger.removeHandler(self.handler)
+
+    def warn(self, hosts):
+
+        for host in hosts:
+            self.hostslog.warning("host %s not found in cluster %s", host,
+                                  'c0')
+        self.hostslog.flush()
+        return self.handler.messages.pop()
+
+    def test_folded(self):
+
+        self.assertEqual(self.warn([ 'cn2', 'cn1', 'cn3', 'admin1' ]),
+                         "host admin1,cn[1-3] not found in cluster c0")
+
+    def test_invalid_nodeset(self):
+
+        self.assertEqual(self.warn([ 'cn2', 'bad[1', 'cn1' ]),
+                         "host bad[1, cn1, cn2 not found in cluster c0")
+
+    def test_nodeset_syntax(self):
+
+        self.assertEqual(self.warn([ 'x!y', 'cn1' ]),
+                         "host cn1, x!y not found in cluster c0")
+        self.assertEqual(self.warn([ 'web@1' ]),
+                         "host web@1 not found in cluster c0")
+        self.assertEqual(self.warn([ 'a&b', 'a^b', 'a*b' ]),
+                         "host a&b, a*b, a^b not found in cluster c0")
+
+    def test_cache(self):
+
+        hosts = [ 'cn%d' % (index) for index in range(1, 5) ]
+        self.assertEqual(self.warn(hosts),
+                         "host cn[1-4] not found in cluster c0")
+        self.assertEqual(self.warn(hosts),
+                         "host cn[1-4] not found in cluster c0")
+        self.assertEqual(list(self.hostslog.folded), [ tuple(hosts) ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+import os
+import sys
+import subprocess
+import unittest
+
+from sitegen import TOP
+
+from bench_startup import app_import_time
+
+# prints the given modules, or their submodules, loaded at startup
+DRIVER = """
+import sys
+import hpci2sync.app
+sys.stdout.write(' '.join(sorted([ name for name in sys.modules
+                                   if name in sys.argv[1:] or
+                                      name.split('.')[0] in sys.argv[1:] ])))
+"""
+
+HEAVY_MODULES = [ 'jinja2', 'yaml', 'ClusterShell' ]
+
+# modules only required by some actions
+ACTIONS_MODULES = [ 'difflib', 'sqlite3', 'ssl', 'http', 'httplib',
+                    'multiprocessing',
+                    'hpci2sync.api', 'hpci2sync.conflicts',
+                    'hpci2sync.emitter', 'hpci2sync.fragcache',
+                    'hpci2sync.generations', 'hpci2sync.hieradata',
+                    'hpci2sync.index', 'hpci2sync.install',
+                    'hpci2sync.journal', 'hpci2sync.privatedata',
+                    'hpci2sync.semdiff', 'hpci2sync.shard',
+                    'hpci2sync.source', 'hpci2sync.staging',
+                    'hpci2sync.state' ]
+
+# Budget of hpci2sync.app cumulative import time, about twice the 80ms
+# measured with python 3.11 by tests/bench_startup.py. Importing jinja2, yaml
+# and ClusterShell adds 90ms.
+IMPORT_BUDGET = 0.16
+
+class StartupImportsTest(unittest.TestCase):
+    """Jinja2, YAML, ClusterShell and the modules of the actions are
+       imported by the actions needing them, not when hpci2sync starts."""
+
+    def loaded(self, modules):
+
+        environ = dict(os.environ)
+        environ['PYTHONPATH'] = TOP
+        output = subprocess.check_output([ sys.executable, '-c', DRIVER ] +
+                                         modules, env=environ)
+        return output.decode('utf-8')
+
+    def test_heavy_modules(self):
+
+        self.assertEqual(self.loaded(HEAVY_MODULES), '')
+
+    def test_actions_modules(self):
+
+        self.assertEqual(self.loaded(ACTIONS_MODULES), '')
+
+    @unittest.skipIf(sys.version_info < (3, 7),
+                     "python -X importtime is not available")
+    def test_import_budget(self):
+
+        self.assertLess(app_import_time(), IMPORT_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+from sitegen import TOP, make_site
+
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+# runs a dry-run conf action and prints the peak of traced memory
+DRIVER = """
+import sys, tracemalloc
+sys.argv = [ 'hpci2sync', '-c', sys.argv[1], 'conf', '--dry-run' ]
+tracemalloc.start()
+from hpci2sync.app import MainApp
+MainApp().run()
+sys.stdout.write('%d\\n' % (tracemalloc.get_traced_memory()[1]))
+"""
+
+MIB = 1024 * 1024
+
+@unittest.skipIf(tracemalloc is None, "tracemalloc is not available")
+class PipelineMemoryTest(unittest.TestCase):
+    """With pipeline mode, conflicts ignored and no fragments cache, the peak
+       of memory must not grow with the number of clusters."""
+
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root)
+
+    def peak(self, clusters, pipeline):
+
+        name = 'site-%d-%s' % (clusters, pipeline)
+        conf_file = make_site(os.path.join(self.root, name),
+                              clusters=clusters, nodes=500,
+                              extra_conf=[ 'pipeline = %s' % (pipeline),
+                                           'conflicts = ignore',
+                                           'cache_size = 0' ])
+        environ = dict(os.environ)
+        environ['PYTHONPATH'] = TOP
+        output = subprocess.check_output([ sys.executable, '-c', DRIVER,
+                                           conf_file ],
+                                         stderr=subprocess.STDOUT, env=environ)
+        return int(output.decode('utf-8').splitlines()[-1])
+
+    def test_peak(self):
+
+        growth = self.peak(6, 'no') - self.peak(2, 'no')
+        pipeline_growth = self.peak(6, 'yes') - self.peak(2, 'yes')
+        # the whole site is loaded without pipeline
+        self.assertGreater(growth, 2 * MIB)
+        self.assertLess(pipeline_growth, growth / 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from sitegen import make_site, run, ROLES
+
+class QueryTest(unittest.TestCase):
+    """Query action on a site where clusters c0 and c1 have equipments with
+       the same names."""
+
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+        self.conf_file = make_site(self.root)
+        pd = os.path.join(self.root, 'pd')
+        for path in [ os.path.join(pd, 'hieradata', 'c1', 'cluster.yaml'),
+                      os.path.join(pd, 'hieradata', 'c1', 'network.yaml'),
+                      os.path.join(pd, 'monitoring', 'equipments', 'c1',
+                                   'server.yaml'),
+                      os.path.join(pd, 'monitoring', 'equipments', 'c1',
+                                   'switch.yaml') ]:
+            with open(path) as stream:
+                content = stream.read()
+            with open(path, 'w') as stream:
+                stream.write(content.replace('c1', 'c0'))
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root)
+
+    def query(self, *args):
+
+        code, output = run(self.conf_file, 'query', '--format', 'json',
+                           *args)
+        self.assertEqual(code, 0, output)
+        return json.loads(output[output.index('['):])
+
+    def test_same_names(self):
+
+        hosts = self.query('--host', 'c0cn1')
+        self.assertEqual([ (host['cluster'], host['zone'], host['ip'])
+                           for host in hosts ],
+                         [ ('c0', 'c0', '10.0.0.1'),
+                           ('c1', 'c1', '10.1.0.1') ])
+
+    def test_joined(self):
+
+        hosts = self.query('--cluster', 'c1', '--role', 'cn')
+        self.assertEqual(len(hosts), 8)
+        for index, host in enumerate(sorted(hosts,
+                                            key=lambda host: host['ip'])):
+            self.assertEqual(host['netifs'],
+                             { 'administration': '10.1.0.%d' % (index + 1),
+                               'bmc': '10.1.1.%d' % (index + 1) })
+            self.assertEqual(host['profiles'], sorted(ROLES['cn']))
+        # the index is reused by the second query
+        self.assertEqual(self.query('--ip', '10.1.1.3')[0]['netifs'],
+                         hosts[2]['netifs'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from hpci2sync.semdiff import InstalledObjects, ParseError
+
+# hosts file with non-ASCII characters
+HOSTS = u'''object Host "cn1.example.com" {
+  import "hpc-compute-node"
+  display_name = "cn1"
+  address = "10.0.0.1"
+  vars.rack = "bâtiment 1"
+}
+'''
+
+class InstalledObjectsTest(unittest.TestCase):
+    """Objects of installed files, saved or parsed."""
+
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+        self.dst_file = os.path.join(self.root, 'hosts.conf')
+        with open(self.dst_file, 'wb') as stream:
+            stream.write(HOSTS.encode('utf-8'))
+        self.installed = InstalledObjects(os.path.join(self.root,
+                                                       'objects.json'),
+                                          self.root)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root)
+
+    def test_digest(self):
+
+        self.assertEqual(InstalledObjects.digest(HOSTS),
+                         InstalledObjects.digest(HOSTS.encode('utf-8')))
+
+    def test_parsed(self):
+
+        objects = self.installed.objects('c0/hosts.conf', self.dst_file)
+        self.assertEqual(len(objects), 1)
+        self.assertEqual(objects[0]['vars'], { 'rack': u'bâtiment 1' })
+
+    def test_saved(self):
+
+        saved = [ { 'type': 'Host', 'name': 'saved' } ]
+        self.installed.update('c0/hosts.conf', HOSTS, saved)
+        self.installed.save()
+        loaded = InstalledObjects(self.installed.path, self.root)
+        loaded.load()
+        self.assertEqual(loaded.objects('c0/hosts.conf', self.dst_file),
+                         saved)
+        # spilled staged content is read as bytes with python 2
+        self.installed.update('c0/hosts.conf', HOSTS.encode('utf-8'), saved)
+        self.assertEqual(self.installed.objects('c0/hosts.conf',
+                                                self.dst_file), saved)
+
+    def test_invalid(self):
+
+        with open(self.dst_file, 'wb') as stream:
+            stream.write(b'object Host "\xff" {\n}\n')
+        self.assertRaises(ParseError, self.installed.objects,
+                          'c0/hosts.conf', self.dst_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from sitegen import make_site, run, read_tree
+
+class ShardsTest(unittest.TestCase):
+    """Conf runs of all shards followed by the merge step must install the
+       same files as a single conf run."""
+
+    def setUp(self):
+
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.root)
+
+    def site(self, name):
+
+        return make_site(os.path.join(self.root, name), clusters=5)
+
+    def zones(self, name):
+
+        return read_tree(os.path.join(self.root, name, 'icinga2', 'zones.d'))
+
+    @staticmethod
+    def objects_diff(output):
+
+        """Returns the JSON objects diff printed in output."""
+        lines = output.splitlines()
+        start = lines.index('{')
+        end = lines.index('}', start)
+        return json.loads('\n'.join(lines[start:end + 1]))
+
+    def test_merge_as_single_run(self):
+
+        code, output = run(self.site('single'), 'conf', '--diff', 'json')
+        self.assertEqual(code, 0, output)
+        single_diff = self.objects_diff(output)
+
+        conf_file = self.site('sharded')
+        for index in range(1, 4):
+            code, output = run(conf_file, 'conf', '--diff', 'json',
+                               '--shard', '%d/3' % (index))
+            self.assertEqual(code, 0, output)
+        code, output = run(conf_file, 'conf', '--diff', 'json',
+                           '--merge-shards', '3')
+        self.assertEqual(code, 0, output)
+
+        self.assertEqual(self.objects_diff(output), single_diff)
+        single = self.zones('single')
+        self.assertEqual(len(single), 4 + 5 * 3)
+        self.assertEqual(self.zones('sharded'), single)
+
+    def test_store_format(self):
+
+        conf_file = self.site('sharded')
+        code, output = run(conf_file, 'conf', '--shard', '1/1')
+        self.assertEqual(code, 0, output)
+        store = os.path.join(self.root, 'sharded', 'cache', 'shards', '1')
+        files = [ os.path.join(store, 'objects.json') ] + \
+                [ os.path.join(store, 'master', name)
+                  for name in sorted(os.listdir(os.path.join(store,
+                                                             'master'))) ]
+        self.assertEqual(len(files), 1 + 5)
+        # nothing but plain data is loaded by the merge step
+        for path in files:
+            with open(path) as stream:
+                json.load(stream)
+        with open(files[1]) as stream:
+            master = json.load(stream)
+        self.assertEqual(sorted(master['hosts'][0]),
+                         [ 'attrs', 'category', 'fqdn', 'ip', 'name' ])
+
+
+if __name__ == '__main__':
+    unittest.main()
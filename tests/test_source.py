@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright (C) 2016 EDF SA
+#
+#  This file is part of hpci2sync
+#
+#  This software is governed by the CeCILL license under French law and
+#  abiding by the rules of distribution of free software. You can use,
+#  modify and/ or redistribute the software under the terms of the CeCILL
+#  license as circulated by CEA, CNRS and INRIA at the following URL
+#  "http://www.cecill.info".
+#
+#  As a counterpart to the access to the source code and rights to copy,
+#  modify and redistribute granted by the license, users are provided only
+#  with a limited warranty and the software's author, the holder of the
+#  economic rights, and the successive licensors have only limited
+#  liability.
+#
+#  In this respect, the user's attention is drawn to the risks associated
+#  with loading, using, modifying and/or developing or reproducing the
+#  software by the user in light of its specific status of free software,
+#  that may mean that it is complicated to manipulate, and that also
+#  therefore means that it is reserved for developers and experienced
+#  professionals having in-depth computer knowledge. Users are therefore
+#  encouraged to load and test the software's suitability as regards their
+#  requirements in conditions enabling the security of their systems and/or
+#  data to be ensured and, more generally, to use and operate it in the
+#  same conditions as regards security.
+#
+#  The fact that you are presently reading this means that you have had
+#  knowledge of the CeCILL license and that you accept its terms.
+
+
+import os
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+from hpci2sync.source import FilesystemSource, GitSource
+
+class SourceTest(unittest.TestCase):
+    """Sources of a local privatedata git repository, with a first commit
+       and a second one modifying the working tree files."""
+
+    FILES = { 'equipments/alpha/server.yaml': 'alcn[1-2]: {}\n',
+              'equipments/alpha/.hidden.yaml': '',
+              'equipments/beta/switch.yaml': 'besw1: {}\n',
+              'hieradata/alpha/cluster.yaml': 'cluster_prefix: al\n' }
+
+    def setUp(self):
+
+        self.repository = tempfile.mkdtemp()
+        self.commits = []
+        self.write(self.FILES)
+        self.commit('first')
+        self.write({ 'equipments/beta/switch.yaml': 'besw[1-2]: {}\n',
+                     'hieradata/beta/cluster.yaml': 'cluster_prefix: be\n' })
+        self.commit('second')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.repository)
+
+    def path(self, relpath):
+
+        return os.path.join(self.repository, relpath)
+
+    def write(self, files):
+
+        for relpath, content in files.items():
+            if not os.path.isdir(os.path.dirname(self.path(relpath))):
+                os.makedirs(os.path.dirname(self.path(relpath)))
+            with open(self.path(relpath), 'w') as stream:
+                stream.write(content)
+
+    def git(self, *args):
+
+        return subprocess.check_output([ 'git', '-C', self.repository,
+                                         '-c', 'user.name=test',
+                                         '-c', 'user.email=test@test' ]
+                                       + list(args)).decode('utf-8')
+
+    def commit(self, message):
+
+        if not self.commits:
+            self.git('init', '-q')
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', message)
+        self.commits.append(self.git('rev-parse', 'HEAD').strip())
+
+    def test_git_source(self):
+
+        source = GitSource(self.repository, 'HEAD~1')
+        try:
+            self.assertEqual(source.commit, self.commits[0])
+            self.assertEqual(source.listdir(self.path('equipments')),
+                             [ 'alpha', 'beta' ])
+            self.assertTrue(source.isdir(self.path('hieradata/alpha')))
+            self.assertFalse(source.isdir(self.path('hieradata/beta')))
+            self.assertTrue(source.exists(
+                              self.path('hieradata/alpha/cluster.yaml')))
+            self.assertFalse(source.exists(
+                               self.path('hieradata/alpha/network.yaml')))
+            self.assertEqual(source.glob(self.path('equipments/alpha'),
+                                         '*.yaml'),
+                             [ self.path('equipments/alpha/server.yaml') ])
+            self.assertEqual(source.read(
+                               self.path('equipments/beta/switch.yaml')),
+                             'besw1: {}\n')
+            self.assertRaises(IOError, source.open,
+                              self.path('equipments/gamma.yaml'))
+            self.assertRaises(OSError, source.listdir, self.path('files'))
+            self.assertEqual(sorted(source.changed_paths(self.commits[1])),
+                             [ 'equipments/beta/switch.yaml',
+                               'hieradata/beta/cluster.yaml' ])
+            self.assertRaises(ValueError, source.relpath, '/')
+        finally:
+            source.close()
+
+    def test_filesystem_source(self):
+
+        source = FilesystemSource([ self.path('equipments'),
+                                    self.path('hieradata') ])
+        self.assertEqual(source.listdir(self.path('hieradata')),
+                         [ 'alpha', 'beta' ])
+        self.assertTrue(source.isdir(self.path('hieradata/beta')))
+        self.assertFalse(source.exists(self.path('hieradata/beta/x.yaml')))
+        self.assertEqual(source.glob(self.path('equipments/alpha'), '*.yaml'),
+                         [ self.path('equipments/alpha/server.yaml') ])
+        self.assertEqual(source.read(self.path('equipments/beta/switch.yaml')),
+                         'besw[1-2]: {}\n')
+        self.assertEqual([ stat[0] for stat
+                           in source.stats(self.path('equipments')) ],
+                         [ self.path('equipments/alpha/.hidden.yaml'),
+                           self.path('equipments/alpha/server.yaml'),
+                           self.path('equipments/beta/switch.yaml') ])
+        # paths out of the indexed directories are read from the filesystem
+        self.assertIn('.git', source.listdir(self.repository))
+
+
+if __name__ == '__main__':
+    unittest.main()